@@ -8,10 +8,13 @@ load_dotenv()
 apiKey = os.getenv("AG3NTS_API_KEY")
 hq_url_report = os.getenv("AG3NTS_HQ_URL_REPORT")
 
+# Shared session to reuse connections between reports
+_session = requests.Session()
+
 
 def answer(task: str, response: Any):
     print(f'Send answer to task {task} with answer {response}')
-    result = requests.post(
+    result = _session.post(
         url=hq_url_report,
         json={
             "task": task,
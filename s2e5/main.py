@@ -10,7 +10,7 @@ import api
 from s2e5.audio_services import process_audios
 from s2e5.images_service import process_images
 from services import OpenAiService
-from vector_store import search, index_image, index_audio, index_chunk
+from vector_store import search, index_images_batch, index_audios_batch, index_chunks_batch
 
 key = os.getenv("AG3NTS_API_KEY")
 base_url = os.getenv("AG3NTS_HQ_URL")
@@ -46,15 +46,12 @@ async def main():
     markdown = fetch_article_and_convert_to_markdown()
     print(markdown)
     images = await process_images(markdown)
-    # Index images
-    for image in images:
-        # Get embedding for image description and context
-        index_image(image)
+    # Index images, embedding their descriptions and contexts in a single request
+    index_images_batch(images)
 
     audios = await process_audios(markdown)
     # Index audios
-    for audio in audios:
-        index_audio(audio)
+    index_audios_batch(audios)
 
     # With custom separators
     splitter = MarkdownTextSplitter(
@@ -64,8 +61,7 @@ async def main():
 
     # Split document
     chunks = splitter.split_text(markdown)
-    for chunk in chunks:
-        index_chunk(chunk)
+    index_chunks_batch(chunks)
 
     # Get embeddings for questions
     questions_list = questions.split("\n")
@@ -1,4 +1,7 @@
+import hashlib
 import os
+import shelve
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, List, Tuple
 
 import requests
@@ -7,6 +10,15 @@ from neo4j import GraphDatabase
 
 load_dotenv()
 
+# Shared session to reuse connections between requests
+_session = requests.Session()
+
+# File persisting computed shortest paths between runs
+PATH_CACHE_FILE = '.path_cache'
+
+# Shortest paths keyed by (graph fingerprint, start name, end name)
+_path_cache: dict[tuple[str, str, str], list[str]] = {}
+
 
 class ExecuteQueryParams(TypedDict):
     query: str
@@ -15,7 +27,7 @@ class ExecuteQueryParams(TypedDict):
 
 def execute_query(params: ExecuteQueryParams) -> str:
     params.pop('_thoughts', None)
-    response = requests.get(
+    response = _session.get(
         url=f"{os.getenv('AG3NTS_HQ_URL')}/apidb",
         json={
             "task": "database",
@@ -27,27 +39,63 @@ def execute_query(params: ExecuteQueryParams) -> str:
 
 
 def get_mysql_data() -> Tuple[List[Tuple[int, str]], List[Tuple[int, int]]]:
-    # Get users data
     users_query = ExecuteQueryParams(
         query="SELECT id, username FROM users",
         _thoughts=""
     )
-    users_data = execute_query(users_query)
-    print(users_data)
-    users = [(row['id'], row['username']) for row in users_data]
-
-    # Get connections data
     connections_query = ExecuteQueryParams(
         query="SELECT user1_id, user2_id FROM connections",
         _thoughts=""
     )
-    connections_data = execute_query(connections_query)
+
+    # Get users and connections data concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        users_future = executor.submit(execute_query, users_query)
+        connections_future = executor.submit(execute_query, connections_query)
+        users_data = users_future.result()
+        connections_data = connections_future.result()
+
+    print(users_data)
+    users = [(row['id'], row['username']) for row in users_data]
+
     print(connections_data)
     connections = [(row['user1_id'], row['user2_id']) for row in connections_data]
 
     return users, connections
 
 
+# Maximum number of rows written per transaction
+USERS_CHUNK_SIZE = 10000
+CONNECTIONS_CHUNK_SIZE = 20000
+
+
+def chunks(seq: list, size: int):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _create_users(tx, users: List[dict]):
+    tx.run("""
+        UNWIND $users AS user
+        CREATE (:Person {id: user.id, name: user.name})
+    """, users=users)
+
+
+def _create_connections(tx, connections: List[dict]):
+    tx.run("""
+        UNWIND $connections AS connection
+        MATCH (a:Person {id: connection.source_id})
+        MATCH (b:Person {id: connection.target_id})
+        CREATE (a)-[:KNOWS]->(b)
+    """, connections=connections)
+
+
+def graph_fingerprint(users: List[Tuple[int, str]], connections: List[Tuple[int, int]]) -> str:
+    # Persisted paths are only valid for the users and connections they were computed from
+    data = repr((sorted(users), sorted(connections))).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
 def setup_neo4j_database(uri: str, username: str, password: str, users: List[Tuple[int, str]],
                          connections: List[Tuple[int, int]]):
     print("Setting up Neo4j database...")
@@ -57,41 +105,47 @@ def setup_neo4j_database(uri: str, username: str, password: str, users: List[Tup
 
     with driver.session() as session:
         # Clear existing data
-        session.run("MATCH (n) DETACH DELETE n")
-
-        # Create users
-        for user_id, name in users:
-            session.run(
-                "CREATE (p:Person {id: $id, name: $name})",
-                id=user_id, name=name
-            )
-
-        # Create relationships
-        for source_id, target_id in connections:
-            session.run("""
-                MATCH (a:Person {id: $source_id})
-                MATCH (b:Person {id: $target_id})
-                CREATE (a)-[:KNOWS]->(b)
-            """, source_id=source_id, target_id=target_id)
+        session.execute_write(lambda tx: tx.run("MATCH (n) DETACH DELETE n"))
+
+        # Schema changes cannot share a transaction with data writes
+        session.run("CREATE INDEX person_id IF NOT EXISTS FOR (p:Person) ON (p.id)")
+
+        # Create users and relationships in bounded transactions
+        users_payload = [{"id": user_id, "name": name} for user_id, name in users]
+        for chunk in chunks(users_payload, USERS_CHUNK_SIZE):
+            session.execute_write(_create_users, chunk)
+
+        connections_payload = [
+            {"source_id": source_id, "target_id": target_id} for source_id, target_id in connections
+        ]
+        for chunk in chunks(connections_payload, CONNECTIONS_CHUNK_SIZE):
+            session.execute_write(_create_connections, chunk)
 
     return driver
 
 
-def find_shortest_path(driver: GraphDatabase.driver) -> str:
-    with driver.session() as session:
-        result = session.run("""
-            MATCH p=shortestPath(
-                (start:Person {name: 'Rafał'})-[:KNOWS*]-(end:Person {name: 'Barbara'})
-            )
-            RETURN [node in nodes(p) | node.name] as path
-        """)
+def find_shortest_path(driver: GraphDatabase.driver, fingerprint: str, start: str = 'Rafał',
+                       end: str = 'Barbara') -> str:
+    key = (fingerprint, start, end)
+    if key not in _path_cache:
+        with shelve.open(PATH_CACHE_FILE) as cache:
+            cache_key = f'{fingerprint}:{start}->{end}'
+            if cache_key not in cache:
+                with driver.session() as session:
+                    result = session.run("""
+                        MATCH p=shortestPath(
+                            (start:Person {name: $start})-[:KNOWS*]-(end:Person {name: $end})
+                        )
+                        RETURN [node in nodes(p) | node.name] as path
+                    """, start=start, end=end)
+                    cache[cache_key] = result.single()['path']
+            _path_cache[key] = cache[cache_key]
 
-        path = result.single()['path']
-        return ', '.join(path)
+    return ', '.join(_path_cache[key])
 
 
 def submit_solution(path: str):
-    response = requests.post(
+    response = _session.post(
         url=f"{os.getenv('AG3NTS_HQ_URL')}/report",
         json={
             "task": "connections",
@@ -116,7 +170,7 @@ def main():
 
     try:
         # Find shortest path
-        path = find_shortest_path(driver)
+        path = find_shortest_path(driver, graph_fingerprint(users, connections))
 
         # Submit solution
         result = submit_solution(path)
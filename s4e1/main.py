@@ -1,9 +1,11 @@
 import asyncio
 import base64
-import json
+import hashlib
 import os
+import re
 from typing import Any, Dict
 
+import orjson
 import requests
 from dotenv import load_dotenv
 
@@ -12,6 +14,17 @@ from services import OpenAiService
 load_dotenv()
 service = OpenAiService()
 
+# Shared session to reuse connections between requests
+_session = requests.Session()
+
+# Markdown code fence the model may wrap its JSON output in
+CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?|```$")
+
+
+def parse_json_content(content: str) -> Any:
+    """Parse the model's JSON output, stripping any markdown code fence around it"""
+    return orjson.loads(CODE_FENCE_PATTERN.sub('', content.strip()).strip())
+
 
 def send_request(answer: str) -> Dict[Any, Any]:
     """Send request to the API endpoint"""
@@ -23,7 +36,7 @@ def send_request(answer: str) -> Dict[Any, Any]:
 
     try:
         print(f"Sending request: {payload}")
-        response = requests.post(
+        response = _session.post(
             url=os.getenv('AG3NTS_HQ_URL_REPORT'),
             json=payload
         )
@@ -42,6 +55,9 @@ state = {
     'flag': ''
 }
 
+# Vision analysis results keyed by SHA-256 of the image bytes
+_analysis_cache: dict[str, dict] = {}
+
 
 async def initial_processing(start_output):
     prompt = '''
@@ -76,10 +92,7 @@ async def initial_processing(start_output):
     )
 
     # Clean any potential remaining markdown or whitespace
-    content = completion.choices[0].message.content.strip()
-    content = content.replace('```json', '').replace('```', '').strip()
-
-    result = json.loads(content)
+    result = parse_json_content(completion.choices[0].message.content)
     print(result)
 
     # Update state with results from initial processing
@@ -110,10 +123,16 @@ async def analyze_image(base_url: str, image_name: str) -> Dict[str, str]:
         Dictionary containing preview description and required action
     """
     print(f'Analyzing image: {image_name}')
-    preview = requests.get(f'{base_url}/{image_name}')
+    preview = _session.get(f'{base_url}/{image_name}')
     if preview.status_code != 200:
         print(f'Error fetching image {image_name}')
         return {}
+
+    key = hashlib.sha256(preview.content).hexdigest()
+    if key in _analysis_cache:
+        print(f'Using cached analysis for image: {image_name}')
+        return _analysis_cache[key]
+
     preview_base64 = base64.b64encode(preview.content).decode('utf-8')
 
     prompt = '''
@@ -151,10 +170,11 @@ async def analyze_image(base_url: str, image_name: str) -> Dict[str, str]:
         ]
     )
 
-    content = completion.choices[0].message.content.strip()
+    content = completion.choices[0].message.content
     print(content)
-    content = content.replace('```json', '').replace('```', '').strip()
-    return json.loads(content)
+    result = parse_json_content(content)
+    _analysis_cache[key] = result
+    return result
 
 
 async def process_outcome(outcome: Dict[str, str]):
@@ -185,10 +205,7 @@ async def process_outcome(outcome: Dict[str, str]):
     )
 
     # Clean any potential remaining markdown or whitespace
-    content = completion.choices[0].message.content.strip()
-    content = content.replace('```json', '').replace('```', '').strip()
-
-    result = json.loads(content)
+    result = parse_json_content(completion.choices[0].message.content)
     return result
 
 
@@ -211,8 +228,6 @@ async def main():
                 image['edited_name'] = r.get('image_name', '')
             else:
                 print("No action required for this image.")
-                r2 = await analyze_image(state['base_image_url'], image['edited_name'])
-                image['preview'] = r2.get('preview', '')
                 combined_preview += image['preview']
 
             print(image)
@@ -3,39 +3,52 @@ import asyncio
 import api
 from services import OpenAiService
 
+# Maximum number of verification requests in flight at once
+MAX_CONCURRENT_REQUESTS = 16
+
+
+async def verify_record(service: OpenAiService, semaphore: asyncio.Semaphore, identifier: str, record: str):
+    # Create completion request
+    messages = [
+        {"role": "system", "content": "Verify the result"},
+        {"role": "user", "content": record}
+    ]
+
+    async with semaphore:
+        try:
+            # Get completion response
+            response = await service.completion(messages, model="ft:gpt-4o-mini-2024-07-18:personal::AY9Cyd3i")
+            result = response.choices[0].message.content
+        except Exception as e:
+            print(f"Error processing record {identifier}: {e}")
+            return identifier, None
+
+    print(f"ID: {identifier}")
+    print(f"Record: {record}")
+    print(f"Result: {result}")
+    print("-" * 50)
+
+    return identifier, result
+
 
 async def process_verify_records():
     service = OpenAiService()
-    correct_identifiers = []
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
     # Read and process verify.txt
     with open('Lab Data S04E02/verify.txt', 'r') as file:
-        for line in file:
-            # Split identifier and record
-            identifier, record = line.strip().split('=')
-
-            # Create completion request
-            messages = [
-                {"role": "system", "content": "Verify the result"},
-                {"role": "user", "content": record}
-            ]
-
-            try:
-                # Get completion response
-                response = await service.completion(messages, model="ft:gpt-4o-mini-2024-07-18:personal::AY9Cyd3i")
-                result = response.choices[0].message.content
-
-                print(f"ID: {identifier}")
-                print(f"Record: {record}")
-                print(f"Result: {result}")
-                print("-" * 50)
-
-                # Collect identifier if result is CORRECT
-                if result.strip().upper() == "CORRECT":
-                    correct_identifiers.append(identifier)
-
-            except Exception as e:
-                print(f"Error processing record {identifier}: {e}")
+        # Split identifier and record
+        records = [line.strip().split('=') for line in file]
+
+    results = await asyncio.gather(
+        *(verify_record(service, semaphore, identifier, record) for identifier, record in records)
+    )
+
+    # Collect identifiers with CORRECT result
+    correct_identifiers = [
+        identifier for identifier, result in results
+        if result is not None and result.strip().upper() == "CORRECT"
+    ]
 
     print("Identifiers with CORRECT results:")
     print(", ".join(correct_identifiers))
@@ -1,12 +1,11 @@
 import json
+from itertools import islice
 
 
 def read_file_lines(filepath, start=0, limit=None):
     with open(filepath, 'r') as file:
-        lines = file.readlines()
-        if limit:
-            return [line.strip() for line in lines[start:start + limit]]
-        return [line.strip() for line in lines[start:]]
+        lines = islice(file, start, None if limit is None else start + limit)
+        return [line.strip() for line in lines]
 
 
 def create_jsonl_entry(record, is_correct):
@@ -17,22 +16,18 @@ def create_jsonl_entry(record, is_correct):
 def write_jsonl(filename, correct_records, incorrect_records):
     with open(filename, 'w') as outfile:
         # Process correct records
-        for record in correct_records:
-            jsonl_entry = create_jsonl_entry(record, True)
-            outfile.write(json.dumps(jsonl_entry) + '\n')
+        outfile.writelines(json.dumps(create_jsonl_entry(record, True)) + '\n' for record in correct_records)
 
         # Process incorrect records
-        for record in incorrect_records:
-            jsonl_entry = create_jsonl_entry(record, False)
-            outfile.write(json.dumps(jsonl_entry) + '\n')
+        outfile.writelines(json.dumps(create_jsonl_entry(record, False)) + '\n' for record in incorrect_records)
 
 
-# Process training data (first 150 records)
-training_correct = read_file_lines('Lab Data S04E02/correct.txt', start=0, limit=192)
-training_incorrect = read_file_lines('Lab Data S04E02/incorrect.txt', start=0, limit=192)
-write_jsonl('training_output.jsonl', training_correct, training_incorrect)
+# Read each file once, up to the furthest line needed by either set
+correct = read_file_lines('Lab Data S04E02/correct.txt', start=0, limit=192)
+incorrect = read_file_lines('Lab Data S04E02/incorrect.txt', start=0, limit=192)
+
+# Process training data (first 192 records)
+write_jsonl('training_output.jsonl', correct, incorrect)
 
 # Process verification data (records 150-190)
-verify_correct = read_file_lines('Lab Data S04E02/correct.txt', start=150, limit=40)
-verify_incorrect = read_file_lines('Lab Data S04E02/incorrect.txt', start=150, limit=40)
-write_jsonl('verify_output.jsonl', verify_correct, verify_incorrect)
+write_jsonl('verify_output.jsonl', correct[150:190], incorrect[150:190])
@@ -1,12 +1,84 @@
-import json
+import asyncio
+import hashlib
+import shelve
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Tuple
 
-from agent_tools import AgentTool
-
+import aiohttp
+import httpx
+import orjson
 
-@dataclass
+from agent_tools import AgentTool
+from semantic_cache import SemanticLLMCache
+from tokenization import count_text_tokens, prompt_budget, truncate_to_budget
+from usage_tracker import UsageTracker
+
+# Number of latest context entries sent verbatim to the LLM
+MAX_RECENT_CONTEXT_ENTRIES = 5
+# Number of unsummarized context entries that triggers folding older ones into the summary
+CONTEXT_SUMMARY_THRESHOLD = 10
+# Maximum number of independent steps the planner may request to run concurrently
+MAX_PARALLEL_STEPS = 3
+# Maximum number of simultaneous connections of the HTTP session shared by the tools
+HTTP_CONNECTION_LIMIT = 32
+# Seconds an idle connection of the shared HTTP session is kept open for reuse
+HTTP_KEEPALIVE_TIMEOUT = 60
+# Tool results up to this size are used as key findings directly, without LLM extraction
+LOCAL_EXTRACTION_MAX_CHARS = 2000
+# Maximum length of the text embedded as a semantic cache key
+SEMANTIC_KEY_MAX_CHARS = 20000
+# Maximum tokens of step results sent together in a single extraction request
+EXTRACTION_BATCH_MAX_TOKENS = 64000
+# Response format of all LLM requests expecting a JSON object, shared instead of rebuilt per call
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+# Minimal similarity of a previously solved task for its plan to be reused as a template
+PLAN_TEMPLATE_SIMILARITY = 0.90
+# Cheaper model used to adapt a plan template instead of planning from scratch
+PLAN_ADAPTATION_MODEL = 'gpt-4o-mini'
+# Models tried in order for information extraction, from the cheapest
+EXTRACTION_MODELS = ('gpt-4o-mini', 'gpt-4o')
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    """Creates the aiohttp session shared by the HTTP tools"""
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+        limit=HTTP_CONNECTION_LIMIT, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+    ))
+
+
+def create_http2_client() -> httpx.AsyncClient:
+    """Creates the HTTP/2 client shared by the tools calling a single host repeatedly"""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=HTTP_CONNECTION_LIMIT, max_keepalive_connections=HTTP_CONNECTION_LIMIT),
+        timeout=30.0
+    )
+
+
+def _cache_key(obj: Any) -> str:
+    """Returns a 128-bit digest of the canonical JSON form of obj, used as a cache key"""
+    return hashlib.blake2b(orjson.dumps(obj, option=orjson.OPT_SORT_KEYS, default=str), digest_size=16).hexdigest()
+
+
+def _is_replayable(completion_kwargs: Dict[str, Any]) -> bool:
+    """Whether a completion is deterministic, so its response can be reused for an identical request"""
+    return not completion_kwargs.get('stream') and completion_kwargs.get('temperature', 1) == 0
+
+
+def _string_values(value: Any):
+    """Yields the strings nested in a JSON-like value"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _string_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _string_values(item)
+
+
+@dataclass(slots=True, frozen=True)
 class ContextEntry:
     """Represents a single context entry from tool execution"""
     tool_name: str
@@ -14,29 +86,72 @@ class ContextEntry:
     parameters: Dict[str, Any]
     timestamp: datetime
     related_info: Dict[str, Any]
+    params_json: str = ""
+    info_json: str = ""
 
 
 class Agent:
     """Agent that can understand tasks and execute tools"""
 
-    def __init__(self, available_tools: List[AgentTool], llm_service):
+    def __init__(self, available_tools: List[AgentTool], llm_service, cache_path: Optional[str] = None,
+                 semantic_cache: Optional[SemanticLLMCache] = None,
+                 http_session: Optional[aiohttp.ClientSession] = None,
+                 http2_client: Optional[httpx.AsyncClient] = None):
         """
         Initialize the agent with tools and LLM service
 
         Args:
             available_tools (List[AgentTool]): List of tools available to the agent
             llm_service: OpenAiService instance for LLM interactions
+            cache_path (str, optional): Path of the shelve file persisting LLM responses across runs
+            semantic_cache (SemanticLLMCache, optional): Cache reusing planning and extraction responses
+                for semantically similar requests
+            http_session (aiohttp.ClientSession, optional): Session shared with other agents, left open after runs.
+                A session is created for each run when not given
+            http2_client (httpx.AsyncClient, optional): HTTP/2 client shared with other agents, left open after runs.
+                A client is created for each run when not given
         """
         self.tools = {tool.name: tool for tool in available_tools}
+        self.http_session = http_session
+        self.http2_client = http2_client
         self.llm_service = llm_service
+        self.cache_path = cache_path
+        self._cache: Dict[str, Any] = {}
+        self.semantic_cache = semantic_cache
+        self._plan_template: Optional[str] = None
+        self._executed_steps: List[Dict[str, Any]] = []
+        # Tool calls of the current run keyed by tool name and canonical parameters
+        self._tool_calls: Dict[str, asyncio.Future] = {}
+        self._extraction_calls = 0
+        self._extraction_escalations = 0
+        self._usage = UsageTracker()
         self.context_history: List[ContextEntry] = []
         self.current_task: Optional[str] = None
-        self.key_findings: List[str] = []
+        # Insertion-ordered set of findings, values are unused
+        self.key_findings: Dict[str, None] = {}
+        self._key_findings_json: Optional[str] = None
+        self.latest_analysis: Optional[Dict[str, Any]] = None
+        self._formatted_context: List[str] = []
+        self._context_summary = ""
+        self._summarized_len = 0
+
+    @property
+    def tools(self) -> Dict[str, AgentTool]:
+        """Tools available to the agent, keyed by name"""
+        return self._tools
+
+    @tools.setter
+    def tools(self, tools: Dict[str, AgentTool]) -> None:
+        """Sets the tools and rebuilds the prompts describing them"""
+        self._tools = tools
+        self._tools_prompt = self._format_tools_for_prompt(tools)
+        self._plan_response_format = self._build_plan_response_format(tools)
+        self._plan_system_prompt = self._format_plan_system_prompt()
 
     async def run(self, task_description: str) -> Any:
         """
-        Main entry point for task execution. Plans and executes one step at a time,
-        evaluating progress after each step.
+        Main entry point for task execution. Plans and executes one step at a time
+        (or a batch of independent steps concurrently), evaluating progress after each step.
 
         Args:
             task_description (str): Description of the task to perform
@@ -48,6 +163,24 @@ class Agent:
         max_steps = 25  # Safety limit to prevent infinite loops
         step_count = 0
 
+        # Look up the plan of a similar, previously solved task to adapt instead of planning from scratch
+        task_embedding = None
+        self._plan_template = None
+        self._executed_steps = []
+        self._tool_calls = {}
+        if self.semantic_cache:
+            task_embedding = await self.semantic_cache.embed(task_description[-SEMANTIC_KEY_MAX_CHARS:])
+            self._plan_template = self.semantic_cache.search(
+                "plan_shape", task_embedding, threshold=PLAN_TEMPLATE_SIMILARITY
+            )
+
+        # Share a single connection pool between all HTTP tools for the run
+        http_session = self.http_session or create_http_session()
+        http2_client = self.http2_client or create_http2_client()
+        for tool in self.tools.values():
+            tool.http_session = http_session
+            tool.http2_client = http2_client
+
         try:
             while step_count < max_steps:
                 # 1. Plan next step
@@ -56,100 +189,209 @@ class Agent:
                     print("No more steps needed - task complete")
                     break
 
-                # 2. Execute the step
-                print(f"Executing step {step_count}: {next_step['plan'][0]['step']}")
-                result = await self.execute(next_step['plan'][0])
-
-                # 3. Create and store context entry
-                context_entry = ContextEntry(
-                    tool_name=next_step['plan'][0]['tool_name'],
-                    step_description=next_step['plan'][0]['step'],
-                    parameters=next_step['plan'][0]['parameters'],
-                    # result=result,
-                    timestamp=datetime.now(),
-                    related_info={}
+                # 2. Execute the step, or all planned steps at once if they are independent
+                steps = next_step['plan'][:1]
+                if next_step.get('independent') and not any(
+                        step['tool_name'] == 'final_answer' for step in next_step['plan']):
+                    steps = next_step['plan'][:MAX_PARALLEL_STEPS]
+
+                for offset, step in enumerate(steps):
+                    print(f"Executing step {step_count + offset}: {step['step']}")
+
+                results = []
+                for layer in self._build_execution_layers(steps):
+                    results.extend(await asyncio.gather(*(self.execute(step) for step in layer)))
+
+                # 3. Extract information from all the results at once and create context entries
+                related_infos = await self._extract_information_batch(results, next_step['required_information'])
+                context_entries = [
+                    self._create_context_entry(step, related_info)
+                    for step, related_info in zip(steps, related_infos)
+                ]
+                self.context_history.extend(context_entries)
+                self._executed_steps.extend(
+                    self._template_step(step, next_step['required_information']) for step in steps
                 )
+                await self._summarize_context()
 
-                # 4. Extract and evaluate information
-                if result:
-                    extracted_info = await self._extract_information(
-                        result,
-                        next_step['required_information']
-                    )
-                    context_entry.related_info = extracted_info['key_findings']
-                    
-                self.context_history.append(context_entry)
-
-                # 5. Evaluate progress and decide whether to continue
-                if next_step['plan'][0]['tool_name'] == 'final_answer':
-                    return result
+                # 4. Evaluate progress and decide whether to continue
+                if steps[0]['tool_name'] == 'final_answer':
+                    if task_embedding is not None and self._plan_template is None:
+                        self.semantic_cache.add(
+                            "plan_shape", task_embedding, orjson.dumps(self._executed_steps, default=str).decode()
+                        )
+                    return results[0]
 
-                step_count += 1
+                step_count += len(steps)
 
-            return self.key_findings
+            return list(self.key_findings)
 
         except Exception as e:
             print(f"Error executing task: {e}")
             raise
 
+        finally:
+            # Shared clients outlive the run, as other agents may be using them
+            if self.http_session is None:
+                for tool in self.tools.values():
+                    tool.http_session = None
+                await http_session.close()
+            if self.http2_client is None:
+                for tool in self.tools.values():
+                    tool.http2_client = None
+                await http2_client.aclose()
+
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """Returns the token usage of the LLM calls made by the agent, including provider prompt cache hits"""
+        return self._usage.get_stats()
+
+    @staticmethod
+    def _build_execution_layers(steps: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Groups steps into layers that can be executed concurrently, in dependency order.
+        A step depends on the other steps listed in its depends_on, or whose description is the
+        whole value of one of its parameters, and is placed in the layer after the latest of them.
+
+        Raises:
+            ValueError: If the steps depend on each other in a cycle
+        """
+        descriptions = {step['step'] for step in steps}
+        dependencies = {
+            step['step']: {*_string_values(step.get('depends_on', [])), *_string_values(step['parameters'])}
+            & (descriptions - {step['step']})
+            for step in steps
+        }
+
+        levels: Dict[str, int] = {}
+
+        def level_of(description: str, visiting: set) -> int:
+            if description not in levels:
+                if description in visiting:
+                    raise ValueError(f"Plan steps depend on each other in a cycle: {description}")
+                visiting.add(description)
+                levels[description] = max(
+                    (level_of(dependency, visiting) + 1 for dependency in dependencies[description]), default=0
+                )
+                visiting.discard(description)
+            return levels[description]
+
+        layers: List[List[Dict[str, Any]]] = []
+        for step in steps:
+            level = level_of(step['step'], set())
+            while len(layers) <= level:
+                layers.append([])
+            layers[level].append(step)
+        return layers
+
+    @staticmethod
+    def _template_step(step: Dict[str, Any], required_info: List[str]) -> Dict[str, Any]:
+        """
+        Returns the shape of an executed step for a plan template: parameter names without their values,
+        so that the template carries no URLs, payloads, findings or answers of the task it was taken from
+        """
+        return {
+            'step': step['step'],
+            'tool_name': step['tool_name'],
+            'parameters': [] if step['tool_name'] == 'final_answer' else sorted(step['parameters']),
+            'required_information': required_info
+        }
+
+    @staticmethod
+    def _create_context_entry(step: Dict[str, Any], related_info: Any) -> ContextEntry:
+        """Creates the context entry for an executed step"""
+        return ContextEntry(
+            tool_name=step['tool_name'],
+            step_description=step['step'],
+            parameters=step['parameters'],
+            timestamp=datetime.now(),
+            related_info=related_info,
+            params_json=orjson.dumps(step['parameters'], option=orjson.OPT_INDENT_2).decode(),
+            info_json=orjson.dumps(related_info, option=orjson.OPT_INDENT_2).decode()
+        )
+
     async def _plan_next_step(self, task_description: str) -> Dict[str, Any]:
         """
-        Plans the next single step based on current context and task description.
+        Plans the next step based on current context and task description.
+        May return several steps flagged as independent to be executed concurrently.
         """
         formatted_context = self._format_context_for_prompt()
-        formatted_tools = self._format_tools_for_prompt()
-        key_findings_str = json.dumps(self.key_findings, indent=2)
+        key_findings_str = self._format_key_findings_for_prompt()
 
-        prompt = f"""Given the task description, current context, and key findings, determine the SINGLE NEXT STEP to take.
-        
-        Available tools:
-        {formatted_tools}
-        
-        Task description: {task_description}
+        def build_messages(key_findings: str) -> List[Dict[str, Any]]:
+            prompt = f"""Task description: {task_description}
         
         Current Context:
         {formatted_context}
         
         Key Findings:
-        {key_findings_str}
-                
-        <rules>
-        1. Plan only ONE next step that brings us closer to completing the task
-        2. Keep any placeholders in the format [[PLACEHOLDER_NAME]]
-        3. Consider the context history to avoid redundant operations
-        4. Use ONLY the tools and parameters listed in the 'Available tools' section
-        5. Base your decision on factual information from the key findings and context
-        6. Do not introduce any information or assumptions not present in the provided data
-        </rules>
+        {key_findings}
+        """
+            if self._plan_template:
+                prompt += f"""
+        Plan that solved a similar task:
+        {self._plan_template}
         
-        Respond in the following JSON format:
-        {{
-            "_thinking": "Explain why this specific step is the best next action, referencing key findings or context",
-            "plan": [
-                {{
-                    "step": "description of the single next step",
-                    "tool_name": "exact name of the tool to use from the available tools",
-                    "parameters": {{
-                        "param1": "value1",
-                        "param2": "value2"
-                    }}
-                }}
-            ],
-            "required_information": [
-                "list of specific information we need to extract from this step's result"
-            ]
-        }}
+        Adapt this plan to the current task and context to determine the next step.
         """
+            return [
+                {"role": "system", "content": self._plan_system_prompt},
+                {"role": "user", "content": prompt}
+            ]
 
-        response = await self.llm_service.completion(
-            messages=[{"role": "system", "content": prompt}],
-            response_format={"type": "json_object"}
+        # Key findings are the only unbounded part of the prompt
+        messages = build_messages(key_findings_str)
+        truncated_findings = truncate_to_budget(messages, key_findings_str)
+        if truncated_findings is not key_findings_str:
+            messages = build_messages(truncated_findings)
+
+        completion_kwargs = {"model": PLAN_ADAPTATION_MODEL} if self._plan_template else {}
+        # Only exactly repeated planning requests are reused. A similar task's plan holds its own URLs and
+        # payloads, and consecutive steps differ by too little for a similarity search to tell them apart.
+        # Similar tasks contribute through the plan template instead
+        response = await self._cached_completion(
+            messages=messages,
+            response_format=self._plan_response_format,
+            temperature=0,
+            **completion_kwargs
         )
+        content = response.choices[0].message.content
 
         print("Next step plan:")
-        print(response.choices[0].message.content)
+        print(content)
+
+        return self._validate_plan(content)
+
+    def _validate_plan(self, content: str) -> Dict[str, Any]:
+        """
+        Parses the planner response and validates its shape before any step is executed.
 
-        return json.loads(response.choices[0].message.content)
+        Raises:
+            ValueError: If the response is not valid JSON or does not match the plan format
+        """
+        try:
+            next_step = orjson.loads(content)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(f"Plan is not valid JSON: {e}")
+
+        if not isinstance(next_step, dict) or not isinstance(next_step.get('plan'), list):
+            raise ValueError("Plan must be a JSON object with a 'plan' list")
+
+        for step in next_step['plan']:
+            if not isinstance(step, dict):
+                raise ValueError(f"Plan step must be an object, got: {step}")
+            if not isinstance(step.get('step'), str):
+                raise ValueError(f"Plan step is missing its description: {step}")
+            if step.get('tool_name') not in self.tools:
+                raise ValueError(f"Unknown tool: {step.get('tool_name')}")
+            if not isinstance(step.setdefault('parameters', {}), dict):
+                raise ValueError(f"Plan step parameters must be an object: {step}")
+            if not isinstance(step.setdefault('depends_on', []), list):
+                raise ValueError(f"Plan step 'depends_on' must be a list: {step}")
+
+        if not isinstance(next_step.setdefault('required_information', []), list):
+            raise ValueError("Plan 'required_information' must be a list")
+
+        return next_step
 
     async def _evaluate_progress(self, task_description: str) -> Dict[str, Any]:
         """
@@ -164,7 +406,7 @@ class Agent:
         Current Context:
         {formatted_context}
         
-        Key findings so far: {self.key_findings}
+        Key findings so far: {list(self.key_findings)}
         
         Respond in the following JSON format:
         {{
@@ -175,12 +417,13 @@ class Agent:
         }}
         """
 
-        response = await self.llm_service.completion(
+        response = await self._cached_completion(
             messages=[{"role": "system", "content": prompt}],
-            response_format={"type": "json_object"}
+            response_format=JSON_RESPONSE_FORMAT,
+            temperature=0
         )
 
-        return json.loads(response.choices[0].message.content)
+        return orjson.loads(response.choices[0].message.content)
 
     async def execute(self, step: Dict[str, Any]) -> Any:
         """
@@ -199,38 +442,308 @@ class Agent:
             raise ValueError(f"Unknown tool: {tool_name}")
 
         tool = self.tools[tool_name]
-        return tool.execute(parameters)
+
+        # Calls with side effects, like POST requests, are made every time they are planned
+        if not tool.is_idempotent(parameters):
+            return await tool.aexecute(parameters)
+
+        # Reuse the result of an identical call made earlier in the run, or join it while in flight
+        key = f"{tool_name}:{_cache_key(parameters)}"
+        call = self._tool_calls.get(key)
+        if call is None:
+            call = self._tool_calls[key] = asyncio.ensure_future(tool.aexecute(parameters))
+        else:
+            print(f"Reusing result of a previous {tool_name} call")
+
+        try:
+            result = await call
+        except Exception:
+            self._forget_tool_call(key, call)
+            raise
+
+        # Failed calls are not reused, so that the planner can retry them
+        if result is None:
+            self._forget_tool_call(key, call)
+        return result
+
+    def _forget_tool_call(self, key: str, call: asyncio.Future) -> None:
+        if self._tool_calls.get(key) is call:
+            del self._tool_calls[key]
+
+    async def _cached_completion(self, messages: List[Dict[str, Any]], **kwargs) -> Any:
+        """
+        Calls the LLM service, reusing responses for identical requests.
+
+        Responses are keyed by a digest of the messages and completion arguments
+        and, when cache_path is set, persisted so re-runs of the same task replay
+        without hitting the LLM. Streamed and sampled requests (temperature > 0,
+        which is the API default when it is not given) are not cached, as their
+        responses cannot be replayed.
+        """
+        if not _is_replayable(kwargs):
+            response = await self.llm_service.completion(messages=messages, **kwargs)
+            self._usage.add(getattr(response, 'usage', None))
+            return response
+
+        key = _cache_key([messages, kwargs])
+
+        if key in self._cache:
+            return self._cache[key]
+
+        if self.cache_path:
+            with shelve.open(self.cache_path) as cache:
+                if key in cache:
+                    self._cache[key] = cache[key]
+                    return self._cache[key]
+
+        response = await self.llm_service.completion(messages=messages, **kwargs)
+        self._usage.add(getattr(response, 'usage', None))
+        self._cache[key] = response
+
+        if self.cache_path:
+            with shelve.open(self.cache_path) as cache:
+                cache[key] = response
+
+        return response
+
+    async def _semantic_completion(self, namespace: str, key_text: str, messages: List[Dict[str, Any]],
+                                   **kwargs) -> str:
+        """
+        Returns the response content of a previous request with a semantically similar key
+        from the same namespace, calling the LLM on a miss.
+        """
+        if self.semantic_cache is None or not _is_replayable(kwargs):
+            response = await self._cached_completion(messages=messages, **kwargs)
+            return response.choices[0].message.content
+
+        embedding = await self.semantic_cache.embed(key_text[-SEMANTIC_KEY_MAX_CHARS:])
+        cached = self.semantic_cache.search(namespace, embedding)
+        if cached is not None:
+            return cached
+
+        response = await self._cached_completion(messages=messages, **kwargs)
+        content = response.choices[0].message.content
+        self.semantic_cache.add(namespace, embedding, content)
+        return content
 
     def _format_context_for_prompt(self) -> str:
-        """Formats the context history into a readable string for the prompt"""
+        """
+        Formats the context history into a readable string for the prompt.
+
+        Entries already folded by _summarize_context are represented by the
+        rolling summary, the remaining ones are included verbatim.
+        """
         if not self.context_history:
             return "No previous context available."
 
-        context_entries = []
-        for entry in self.context_history:
-            context_str = (
+        # Entries are not modified once appended, so only format the new ones
+        for entry in self.context_history[len(self._formatted_context):]:
+            self._formatted_context.append(
                 f"Step: {entry.step_description}\n"
                 f"Tool Used: {entry.tool_name}\n"
-                f"Parameters: {json.dumps(entry.parameters, indent=2)}\n"
-                f"Related Information: {json.dumps(entry.related_info, indent=2)}\n"
-                f"Timestamp: {entry.timestamp.isoformat()}\n"
+                f"Parameters: {entry.params_json}\n"
+                f"Related Information: {entry.info_json}\n"
                 "---"
             )
-            context_entries.append(context_str)
+
+        context_entries = self._formatted_context[self._summarized_len:]
+        if self._context_summary:
+            context_entries.insert(0, f"Summary of earlier steps:\n{self._context_summary}\n---")
 
         return "\n".join(context_entries)
 
+    async def _summarize_context(self, max_recent: int = MAX_RECENT_CONTEXT_ENTRIES) -> None:
+        """
+        Folds context entries older than the latest max_recent into the rolling summary.
+        The LLM is called only once the unsummarized history exceeds CONTEXT_SUMMARY_THRESHOLD.
+        """
+        if len(self.context_history) - self._summarized_len <= CONTEXT_SUMMARY_THRESHOLD:
+            return
+
+        self._format_context_for_prompt()
+        fold_until = len(self.context_history) - max_recent
+        entries_to_fold = "\n".join(self._formatted_context[self._summarized_len:fold_until])
+
+        def build_messages(entries: str) -> List[Dict[str, Any]]:
+            prompt = f"""Summarize the previous steps of the task execution into a concise summary.
+        Preserve every fact, identifier, URL and result that could be needed to complete the task.
+
+        Task description: {self.current_task}
+
+        Existing summary:
+        {self._context_summary or "None"}
+
+        Steps to include in the summary:
+        {entries}
+
+        Respond in the following JSON format:
+        {{
+            "summary": "Concise summary of all the steps taken so far and their results"
+        }}
+        """
+            return [{"role": "system", "content": prompt}]
+
+        # The folded entries are the only unbounded part of the prompt
+        messages = build_messages(entries_to_fold)
+        truncated_entries = truncate_to_budget(messages, entries_to_fold)
+        if truncated_entries is not entries_to_fold:
+            messages = build_messages(truncated_entries)
+
+        response = await self._cached_completion(
+            messages=messages,
+            response_format=JSON_RESPONSE_FORMAT,
+            temperature=0
+        )
+
+        self._context_summary = orjson.loads(response.choices[0].message.content)['summary']
+        self._summarized_len = fold_until
+
+    def _extract_locally(self, content: Any, required_info: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Extracts information from structured or short content without calling the LLM.
+        Returns None when the content needs to be analyzed by the LLM.
+        """
+        if isinstance(content, dict):
+            matched = [f"{key}: {content[key]}" for key in required_info if key in content]
+            if matched:
+                return {"key_findings": matched}
+
+        if isinstance(content, (dict, list)):
+            serialized = orjson.dumps(content, default=str).decode()
+            if len(serialized) <= LOCAL_EXTRACTION_MAX_CHARS:
+                return {"key_findings": [serialized]}
+        elif isinstance(content, str) and len(content) <= LOCAL_EXTRACTION_MAX_CHARS:
+            return {"key_findings": [content]}
+
+        return None
+
     async def _extract_information(self, content: Any, required_info: List[str]) -> Dict[str, Any]:
         """Extract specific information from content and return it"""
-        prompt = f"""
+        extracted_info = self._extract_locally(content, required_info)
+        if extracted_info is None:
+            extracted_info = await self._extract_information_with_llm(content, required_info)
+
+        self._add_key_findings(extracted_info['key_findings'])
+        return extracted_info
+
+    async def _extract_information_batch(self, contents: List[Any], required_info: List[str]) -> List[Any]:
+        """
+        Extracts information from the results of several steps, returning the key findings of each one.
+        Contents which cannot be extracted locally are sent to the LLM in a single request.
+        """
+        related_infos: List[Any] = [{} for _ in contents]
+        pending = []
+        for index, content in enumerate(contents):
+            if not content:
+                continue
+            extracted_info = self._extract_locally(content, required_info)
+            if extracted_info is None:
+                pending.append(index)
+            else:
+                related_infos[index] = extracted_info['key_findings']
+                self._add_key_findings(extracted_info['key_findings'])
+
+        # Split the contents into as few requests as fit the token budget, and send them concurrently.
+        # Half of the request budget is left for the instructions and the key findings
+        batch_max_tokens = min(EXTRACTION_BATCH_MAX_TOKENS, prompt_budget() // 2)
+        groups: List[List[int]] = []
+        group_tokens = 0
+        for index in pending:
+            tokens = count_text_tokens(str(contents[index]))
+            if not groups or group_tokens + tokens > batch_max_tokens:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(index)
+            group_tokens += tokens
+
+        await asyncio.gather(*(
+            self._extract_group(group, contents, required_info, related_infos) for group in groups
+        ))
+        return related_infos
+
+    async def _extract_group(self, group: List[int], contents: List[Any], required_info: List[str],
+                             related_infos: List[Any]) -> None:
+        """Extracts information from the contents at the group's indices in a single LLM request"""
+        if len(group) == 1:
+            extracted_info = await self._extract_information(contents[group[0]], required_info)
+            related_infos[group[0]] = extracted_info['key_findings']
+            return
+
+        sections = await self._extract_sections_with_llm([contents[index] for index in group], required_info)
+        for index, findings in zip(group, sections):
+            related_infos[index] = findings
+            self._add_key_findings(findings)
+
+    def _add_key_findings(self, findings: List[str]) -> None:
+        """Adds new findings to the key findings"""
+        for finding in findings:
+            if finding not in self.key_findings:
+                self.key_findings[finding] = None
+                self._key_findings_json = None
+
+    async def _extract_sections_with_llm(self, contents: List[Any], required_info: List[str]) -> List[List[str]]:
+        """Extracts information from several contents in a single LLM request, returning findings per content"""
+        def build_messages(sections: str) -> List[Dict[str, Any]]:
+            prompt = f"""
+        Analyze each of the following content sections separately and extract key information based on:
+        1. The required information: {required_info}
+        2. Information relevant to the current task: {self.current_task}
+        3. Key findings crucial to complete the task: {list(self.key_findings)}
+        4. Information that might be useful for future steps
+        5. Results and outcomes of actions taken
+
+        Sections:
+        {sections}
+
+        If a section is the part of the main objective of the task then paste it without any formatting in its key_findings.
+
+        Respond with a JSON object containing:
+        {{
+            "_thinking": "Explain the reasoning behind the extracted information",
+            "sections": {{
+                "section id like 0": {{
+                    "key_findings": [
+                        "concise bullet list of information extracted from this section"
+                    ]
+                }}
+            }}
+        }}
+        
+        """
+            return [{"role": "system", "content": prompt}]
+
+        sections_str = "\n---\n".join(f"[{index}]\n{content}" for index, content in enumerate(contents))
+        messages = build_messages(sections_str)
+        truncated_sections = truncate_to_budget(messages, sections_str)
+        if truncated_sections is not sections_str:
+            messages = build_messages(truncated_sections)
+
+        sections_hash = hashlib.blake2b(sections_str.encode('utf-8'), digest_size=16).hexdigest()
+        response_content = await self._semantic_completion(
+            f"extract_sections:{sections_hash}",
+            f"{self.current_task}\n{required_info}",
+            messages=messages,
+            response_format=JSON_RESPONSE_FORMAT,
+            temperature=0
+        )
+        print("Extracted information:")
+        print(response_content)
+
+        sections = orjson.loads(response_content).get('sections', {})
+        return [sections.get(str(index), {}).get('key_findings', []) for index in range(len(contents))]
+
+    async def _extract_information_with_llm(self, content: Any, required_info: List[str]) -> Dict[str, Any]:
+        """Extract specific information from unstructured content using the LLM"""
+        def build_messages(content_str: str) -> List[Dict[str, Any]]:
+            prompt = f"""
         Analyze the following content and extract key information based on:
         1. The required information: {required_info}
         2. Information relevant to the current task: {self.current_task}
-        3. Key findings crucial to complete the task: {self.key_findings}
+        3. Key findings crucial to complete the task: {list(self.key_findings)}
         4. Information that might be useful for future steps
         5. Results and outcomes of actions taken
 
-        Content: {content}
+        Content: {content_str}
 
         Consider:
         - Direct answers to required information
@@ -245,39 +758,146 @@ class Agent:
             "_thinking": "Explain the reasoning behind the extracted information",
             "related_directly_to_main_objective": "true/false",
             "key_findings": [
-                "concise bullet list of information we need to extract to complete the task, if it is related to the main objective then paste {content} it without any formatting"
+                "concise bullet list of information we need to extract to complete the task, if it is related to the main objective then paste the content without any formatting"
             ]
         }}
         
         """
+            return [{"role": "system", "content": prompt}]
+
+        content_str = str(content)
+        messages = build_messages(content_str)
+        truncated_content = truncate_to_budget(messages, content_str)
+        if truncated_content is not content_str:
+            messages = build_messages(truncated_content)
+
+        content_hash = hashlib.blake2b(str(content).encode('utf-8'), digest_size=16).hexdigest()
+        self._extraction_calls += 1
+
+        # Try the cheap model first and escalate to the default one when its response is unusable
+        for model in EXTRACTION_MODELS:
+            response_content = await self._semantic_completion(
+                f"extract:{model}:{content_hash}",
+                f"{self.current_task}\n{required_info}",
+                messages=messages,
+                response_format=JSON_RESPONSE_FORMAT,
+                temperature=0,
+                model=model
+            )
+            print("Extracted information:")
+            print(response_content)
 
-        response = await self.llm_service.completion(
-            messages=[
-                {"role": "system", "content": prompt},
-            ],
-            response_format={"type": "json_object"}
-        )
-        print("Extracted information:")
-        print(response.choices[0].message.content)
+            try:
+                extracted_info = orjson.loads(response_content)
+            except orjson.JSONDecodeError:
+                extracted_info = None
 
-        extracted_info = json.loads(response.choices[0].message.content)
-        # Update memory with structured information
-        # if isinstance(extracted_info['key_findings'], dict):
-        #     self.memory.update({
-        #         'key_findings': {**self.memory.get('key_findings', {}), **extracted_info['key_findings']},
-        #     })
-        # else:
-        #     self.memory['key_findings'] = extracted_info['key_findings']
+            if extracted_info and extracted_info.get('key_findings'):
+                return extracted_info
 
-        self.key_findings.extend(extracted_info['key_findings'])
+            if model != EXTRACTION_MODELS[-1]:
+                self._extraction_escalations += 1
+                print(f"Escalating extraction from {model} "
+                      f"({self._extraction_escalations}/{self._extraction_calls} extractions escalated)")
 
+        return extracted_info or {"key_findings": []}
+
+    def _format_key_findings_for_prompt(self) -> str:
+        """Serializes the key findings for the prompt, reusing the result until they change"""
+        if self._key_findings_json is None:
+            self._key_findings_json = orjson.dumps(list(self.key_findings), option=orjson.OPT_INDENT_2).decode()
+        return self._key_findings_json
+
+    def _format_plan_system_prompt(self) -> str:
+        """
+        Builds the static part of the planning prompt. It does not change between calls,
+        so it is sent as the first message to benefit from provider-side prompt caching.
+        """
+        return f"""Given the task description, current context, and key findings, determine the SINGLE NEXT STEP to take.
         
-        return extracted_info
+        Available tools:
+        {self._tools_prompt}
+                
+        <rules>
+        1. Plan only ONE next step that brings us closer to completing the task
+           - Exception: if several steps do not depend on each other's results (e.g. scraping multiple pages),
+             plan up to {MAX_PARALLEL_STEPS} of them and set "independent" to true
+           - List in "depends_on" the descriptions of planned steps whose results a step needs
+           - The final_answer step must always be planned alone
+        2. Keep any placeholders in the format [[PLACEHOLDER_NAME]]
+        3. Consider the context history to avoid redundant operations
+        4. Use ONLY the tools and parameters listed in the 'Available tools' section
+        5. Base your decision on factual information from the key findings and context
+        6. Do not introduce any information or assumptions not present in the provided data
+        </rules>
+        
+        Respond with a JSON object following the provided schema.
+        """
 
-    def _format_tools_for_prompt(self) -> str:
-        """Formats the available tools into a string for the prompt"""
+    @staticmethod
+    def _build_plan_response_format(tools: Dict[str, AgentTool]) -> Dict[str, Any]:
+        """
+        Builds the structured output format of the planner from the tools' parameters.
+        Not strict, as strict schemas cannot describe free-form parameter values such as API payloads.
+        """
+        steps = [
+            {
+                "type": "object",
+                "properties": {
+                    "step": {"type": "string", "description": "Description of the step"},
+                    "depends_on": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Descriptions of planned steps whose results this step needs"
+                    },
+                    "tool_name": {"type": "string", "enum": [tool.name]},
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            param: {"description": param_desc}
+                            for param, param_desc in {**tool.required_params, **tool.optional_params}.items()
+                        },
+                        "required": list(tool.required_params),
+                        "additionalProperties": False
+                    }
+                },
+                "required": ["step", "depends_on", "tool_name", "parameters"],
+                "additionalProperties": False
+            }
+            for tool in tools.values()
+        ]
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "plan",
+                "strict": False,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "_thinking": {
+                            "type": "string",
+                            "description": "Why this specific step is the best next action, "
+                                           "referencing key findings or context"
+                        },
+                        "independent": {"type": "boolean"},
+                        "plan": {"type": "array", "items": {"anyOf": steps}},
+                        "required_information": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Specific information to extract from the result of the planned steps"
+                        }
+                    },
+                    "required": ["_thinking", "independent", "plan", "required_information"],
+                    "additionalProperties": False
+                }
+            }
+        }
+
+    @staticmethod
+    def _format_tools_for_prompt(tools: Dict[str, AgentTool]) -> str:
+        """Formats the tools into a string for the prompt, built once whenever the tools are set"""
         tool_descriptions = []
-        for tool in self.tools.values():
+        for tool in tools.values():
             desc = f"Tool: {tool.name}\n"
             desc += f"Description: {tool.description}\n"
             desc += "Required parameters:\n"
@@ -310,7 +930,7 @@ class Agent:
         Context History:
         {formatted_context}
         
-        Current Findings: {self.memory}
+        Current Findings: {list(self.key_findings)}
         
         Analyze the situation and respond in the following JSON format:
         {{
@@ -326,17 +946,18 @@ class Agent:
         }}
         """
 
-        response = await self.llm_service.completion(
+        response = await self._cached_completion(
             messages=[
                 {"role": "system", "content": prompt},
             ],
-            response_format={"type": "json_object"}
+            response_format=JSON_RESPONSE_FORMAT,
+            temperature=0
         )
 
-        analysis_result = json.loads(response.choices[0].message.content)
+        analysis_result = orjson.loads(response.choices[0].message.content)
 
-        # Update memory with analysis
-        self.memory['latest_analysis'] = {
+        # Store the latest analysis
+        self.latest_analysis = {
             'timestamp': datetime.now().isoformat(),
             'analysis': analysis_result
         }
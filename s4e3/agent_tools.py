@@ -1,11 +1,139 @@
-import json
+import asyncio
+import functools
 import logging
 import os
+import random
+import re
+import shelve
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Dict, Any, Union, List
+from typing import Awaitable, Callable, Dict, Any, Mapping, Union, List, Optional, Tuple, TypeVar
 
+import aiohttp
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from tokenization import truncate_to_budget
+
+# Attempts of an HTTP request failing with a connection error or a retryable status
+RETRY_ATTEMPTS = 4
+# Base and maximum delay between attempts, in seconds
+RETRY_BACKOFF = 1
+RETRY_MAX_DELAY = 10
+# Transient statuses worth retrying, client errors such as 401 or 403 are not
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Shared session pooling connections for the synchronous HTTP tool path
+_SESSION = requests.Session()
+_SESSION.headers.update({"Connection": "keep-alive"})
+_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(
+    total=RETRY_ATTEMPTS - 1,
+    backoff_factor=RETRY_BACKOFF,
+    backoff_max=RETRY_MAX_DELAY,
+    status_forcelist=_RETRY_STATUSES,
+    raise_on_status=False
+))
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Connect and read timeouts for synchronous requests, in seconds
+REQUEST_TIMEOUT = (3, 30)
+
+# Seconds for which a scraped page is served from the cache without revalidation,
+# unless the response's Cache-Control sets its own max-age
+SCRAPE_CACHE_TTL = 3600
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+# Maximum number of pages scraped simultaneously by a batch scrape
+SCRAPE_BATCH_CONCURRENCY = 8
+# Output token budget of the final answer
+FINAL_ANSWER_MAX_TOKENS = 500
+
+# Matches [[PLACEHOLDER]] patterns in URLs
+_PLACEHOLDER_RE = re.compile(r'\[\[([^\]]+)\]\]')
+
+
+# Environment variable values resolved for placeholders
+_ENV_CACHE: Dict[str, str] = {}
+
+
+def _substitute_placeholder(match: re.Match) -> str:
+    placeholder = match.group(1)
+    env_value = _ENV_CACHE.get(placeholder)
+    if env_value is None:
+        env_value = os.environ.get(placeholder)
+        if env_value is None:
+            raise ValueError(f"Environment variable {placeholder} not found for placeholder [[{placeholder}]]")
+        _ENV_CACHE[placeholder] = env_value
+    return env_value
+
+
+def _parse_json(content: bytes) -> Any:
+    """Parses a JSON response body with orjson"""
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON response: {e}")
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Returns the seconds to wait before retrying a request that failed with the error,
+    or None when it should not be retried. Honors the delay the server asks for in Retry-After.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        status, headers = error.status, error.headers or {}
+    elif isinstance(error, httpx.HTTPStatusError):
+        status, headers = error.response.status_code, error.response.headers
+    elif isinstance(error, (aiohttp.ClientConnectionError, httpx.TransportError, asyncio.TimeoutError)):
+        status, headers = None, {}
+    else:
+        return None
+
+    if status is not None and status not in _RETRY_STATUSES:
+        return None
+
+    retry_after = headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), RETRY_MAX_DELAY)
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BACKOFF * 2 ** (attempt - 1)))
+
+
+_T = TypeVar("_T")
+
+
+async def _with_retries(send: Callable[[], Awaitable[_T]], idempotent: bool = True) -> _T:
+    """Awaits send, retrying transient failures of idempotent requests with backoff"""
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            return await send()
+        except Exception as e:
+            delay = _retry_delay(e, attempt) if idempotent and attempt < RETRY_ATTEMPTS else None
+            if delay is None:
+                raise
+            logging.getLogger(__name__).warning("Request failed (%s), retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_url(url: str) -> str:
+    """
+    Replaces [[PLACEHOLDER]] patterns in the URL with environment variable values in a single pass.
+    Environment variables are loaded once at startup, so resolved URLs are cached.
+    """
+    return _PLACEHOLDER_RE.sub(_substitute_placeholder, url)
+
+
+def clear_env_cache() -> None:
+    """Forgets cached environment variable values and resolved URLs, e.g. after the environment changes"""
+    _ENV_CACHE.clear()
+    _resolve_url.cache_clear()
 
 
 class AgentTool(ABC):
@@ -18,12 +146,27 @@ class AgentTool(ABC):
 
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        # Shared HTTP session injected by the agent for natively async tools
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        # Shared HTTP/2 client injected by the agent for tools calling a single host repeatedly
+        self.http2_client: Optional[httpx.AsyncClient] = None
 
     @abstractmethod
     def execute(self, params: dict) -> any:
         """Execute the tool with given parameters"""
         pass
 
+    async def aexecute(self, params: dict) -> any:
+        """
+        Execute the tool without blocking the event loop.
+        Runs execute in a worker thread by default, natively async tools should override it.
+        """
+        return await asyncio.to_thread(self.execute, params)
+
+    def is_idempotent(self, params: dict) -> bool:
+        """Whether repeating the call has no further effect, so its result may be reused for an identical call"""
+        return True
+
 
 class HttpMethod(Enum):
     GET = "GET"
@@ -33,6 +176,14 @@ class HttpMethod(Enum):
     PATCH = "PATCH"
 
 
+# Methods sending the payload in the request body
+_BODY_METHODS = frozenset({HttpMethod.POST, HttpMethod.PUT, HttpMethod.PATCH})
+# Methods safe to retry, as repeating them does not repeat their effect
+_IDEMPOTENT_METHODS = frozenset({HttpMethod.GET, HttpMethod.PUT, HttpMethod.DELETE})
+# HTTP methods by their upper-case name
+_METHOD_TABLE = {m.value: m for m in HttpMethod}
+
+
 class MakeApiCallTool(AgentTool):
     """Generic tool for making API calls"""
 
@@ -66,7 +217,50 @@ class MakeApiCallTool(AgentTool):
             ValueError: If required parameters are missing or invalid
             requests.RequestException: If API request fails
         """
-        self.logger.info(f"Making API call to: {params.get('url')} with method: {params.get('method')}")
+        method, url, request_kwargs = self._prepare_request(params)
+
+        try:
+            response = _SESSION.request(method.value, url, timeout=REQUEST_TIMEOUT, **request_kwargs)
+            response.raise_for_status()
+            result = _parse_json(response.content)
+            self.logger.info("API call successful: %s", response.status_code)
+            return result
+        except (requests.RequestException, ValueError) as e:
+            self.logger.error("Error making API call: %s", e)
+            return None
+
+    async def aexecute(self, params: Dict[str, Any]) -> Union[Dict, None]:
+        """Makes the API call on the shared aiohttp session, falling back to a worker thread without one"""
+        if self.http_session is None:
+            return await super().aexecute(params)
+
+        method, url, request_kwargs = self._prepare_request(params)
+
+        async def send() -> Tuple[int, bytes]:
+            async with self.http_session.request(method.value, url, **request_kwargs) as response:
+                response.raise_for_status()
+                return response.status, await response.read()
+
+        try:
+            status, body = await _with_retries(send, idempotent=method in _IDEMPOTENT_METHODS)
+            result = _parse_json(body)
+            self.logger.info("API call successful: %s", status)
+            return result
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.logger.error("Error making API call: %s", e)
+            return None
+
+    def is_idempotent(self, params: Dict[str, Any]) -> bool:
+        return _METHOD_TABLE.get(str(params.get("method", "")).upper()) in _IDEMPOTENT_METHODS
+
+    def _prepare_request(self, params: Dict[str, Any]) -> Tuple[HttpMethod, str, Dict[str, Any]]:
+        """
+        Validates the parameters and resolves the HTTP method, URL and request kwargs.
+
+        Raises:
+            ValueError: If required parameters are missing or invalid
+        """
+        self.logger.info("Making API call to: %s with method: %s", params.get('url'), params.get('method'))
 
         # Validate required parameters
         if not params.get("url"):
@@ -75,46 +269,29 @@ class MakeApiCallTool(AgentTool):
             raise ValueError("Method parameter is required")
 
         # Parse and validate HTTP method
-        try:
-            method = HttpMethod(params["method"].upper())
-        except ValueError:
-            raise ValueError(f"Invalid HTTP method. Must be one of: {[m.value for m in HttpMethod]}")
+        method = _METHOD_TABLE.get(params["method"].upper())
+        if method is None:
+            raise ValueError(f"Invalid HTTP method. Must be one of: {list(_METHOD_TABLE)}")
 
         # Replace placeholders in URL
-        url = params["url"]
-        placeholders = self._extract_placeholders(url)
-        for placeholder in placeholders:
-            env_value = os.getenv(placeholder)
-            if env_value is None:
-                raise ValueError(f"Environment variable {placeholder} not found for placeholder [[{placeholder}]]")
-            url = url.replace(f"[[{placeholder}]]", env_value)
+        url = _resolve_url(params["url"])
 
         # Prepare request kwargs
         request_kwargs = {}
 
         # Add payload for appropriate methods
-        if method in [HttpMethod.POST, HttpMethod.PUT, HttpMethod.PATCH]:
+        if method in _BODY_METHODS:
             payload = params.get("payload", {})
             request_kwargs['json'] = payload
 
-        try:
-            response = requests.request(method.value, url, **request_kwargs)
-            response.raise_for_status()
-            result = response.json()
-            self.logger.info(f"API call successful: {response.status_code}")
-            return result
-        except requests.RequestException as e:
-            self.logger.error(f"Error making API call: {e}")
-            return None
+        return method, url, request_kwargs
 
     def _extract_placeholders(self, url: str) -> List[str]:
         """
         Extracts placeholder names from URL string.
         Example: "api/[[API_KEY]]/data" -> ["API_KEY"]
         """
-        import re
-        pattern = r'\[\[(.*?)\]\]'
-        return re.findall(pattern, url)
+        return _PLACEHOLDER_RE.findall(url)
 
 
 class WebScrapeTool(AgentTool):
@@ -128,7 +305,23 @@ class WebScrapeTool(AgentTool):
     required_params = {
         "url": "The URL of the webpage to scrape"
     }
-    optional_params = {}
+    optional_params = {
+        "raw": "Set to true to get the page as plain text, without the JSON envelope (faster for large pages)"
+    }
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Initialize the tool
+
+        Args:
+            cache_path (str, optional): Path of the shelve file persisting scraped pages between runs
+        """
+        super().__init__()
+        self.cache_path = cache_path
+        # Entries already read or written by this tool, to skip reopening the shelve file
+        self._memory_cache: Dict[str, Dict[str, Any]] = {}
+        # Shelve does not support concurrent access from the worker threads
+        self._cache_lock = threading.Lock()
 
     def execute(self, params: Dict[str, Any]) -> Union[Dict, None]:
         """
@@ -137,6 +330,7 @@ class WebScrapeTool(AgentTool):
         Args:
             params (dict): Dictionary containing:
                 - url (str): The webpage URL to scrape
+                - raw (bool, optional): Whether to request the page as plain text
 
         Returns:
             dict: Scraped content response
@@ -145,36 +339,255 @@ class WebScrapeTool(AgentTool):
             ValueError: If required parameters are missing
             requests.RequestException: If scraping request fails
         """
-        self.logger.info(f"Scraping web content from: {params.get('url')}")
+        url, headers = self._prepare_request(params)
+
+        key = f"jina:{params['url']}:raw" if self._is_raw(params) else f"jina:{params['url']}"
+        cached = self._get_cached(key)
+        if cached is not None and self._is_fresh(cached):
+            self.logger.info("Web scraping served from cache: %s", params['url'])
+            return {"content": cached["content"]}
+        headers.update(self._conditional_headers(cached))
+
+        try:
+            response = _SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 304 and cached is not None:
+                self.logger.info("Web scraping not modified: %s", params['url'])
+                self._store(key, cached["content"], response.headers, cached)
+                return {"content": cached["content"]}
+            response.raise_for_status()
+
+            content = self._read_content(response.content, params)
+            self.logger.info("Web scraping successful: %s", response.status_code)
+            self._store(key, content, response.headers)
+            return {
+                "content": content,
+            }
+        except (requests.RequestException, ValueError) as e:
+            self.logger.error("Error scraping web content: %s", e)
+            return None
+
+    async def aexecute(self, params: Dict[str, Any]) -> Union[Dict, None]:
+        """
+        Scrapes the web content on the shared HTTP/2 client, multiplexing concurrent scrapes
+        over a single connection to Jina. Falls back to a worker thread without the client.
+        """
+        if self.http2_client is None:
+            return await super().aexecute(params)
+
+        url, headers = self._prepare_request(params)
+
+        key = f"jina:{params['url']}:raw" if self._is_raw(params) else f"jina:{params['url']}"
+        cached = await asyncio.to_thread(self._get_cached, key)
+        if cached is not None and self._is_fresh(cached):
+            self.logger.info("Web scraping served from cache: %s", params['url'])
+            return {"content": cached["content"]}
+        headers.update(self._conditional_headers(cached))
+
+        async def send() -> httpx.Response:
+            response = await self.http2_client.get(url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+
+        try:
+            response = await _with_retries(send)
+            if response.status_code == 304 and cached is not None:
+                self.logger.info("Web scraping not modified: %s", params['url'])
+                await asyncio.to_thread(self._store, key, cached["content"], response.headers, cached)
+                return {"content": cached["content"]}
+            response.raise_for_status()
+
+            content = self._read_content(response.content, params)
+            self.logger.info("Web scraping successful: %s (%s)", response.status_code, response.http_version)
+            await asyncio.to_thread(self._store, key, content, response.headers)
+            return {
+                "content": content,
+            }
+        except (httpx.HTTPError, ValueError) as e:
+            self.logger.error("Error scraping web content: %s", e)
+            return None
+
+    @staticmethod
+    def _is_raw(params: Dict[str, Any]) -> bool:
+        return str(params.get("raw", False)).lower() == "true"
+
+    def _read_content(self, body: bytes, params: Dict[str, Any]) -> str:
+        """Returns the page content, decoding the text directly when no JSON envelope was requested"""
+        if self._is_raw(params):
+            return body.decode("utf-8", errors="replace")
+        return _parse_json(body).get("data")['content']
+
+    def _get_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached scrape entry from memory or, when caching to disk is enabled, from the shelve file"""
+        entry = self._memory_cache.get(key)
+        if entry is None and self.cache_path is not None:
+            with self._cache_lock, shelve.open(self.cache_path) as cache:
+                entry = cache.get(key)
+            if entry is not None:
+                self._memory_cache[key] = entry
+        return entry
+
+    def _store(self, key: str, content: str, headers: Mapping[str, str],
+               previous: Optional[Dict[str, Any]] = None) -> None:
+        """Caches the scraped content together with its validators, as allowed by the response's Cache-Control"""
+        cache_control = (headers.get("Cache-Control") or "").lower()
+        if "no-store" in cache_control:
+            self._memory_cache.pop(key, None)
+            if self.cache_path is not None:
+                with self._cache_lock, shelve.open(self.cache_path) as cache:
+                    cache.pop(key, None)
+            return
+
+        max_age = _MAX_AGE_RE.search(cache_control)
+        previous = previous or {}
+        entry = {
+            "content": content,
+            "etag": headers.get("ETag") or previous.get("etag"),
+            "last_modified": headers.get("Last-Modified") or previous.get("last_modified"),
+            "fetched_at": time.time(),
+            "ttl": 0 if "no-cache" in cache_control else int(max_age.group(1)) if max_age else SCRAPE_CACHE_TTL,
+        }
+        self._memory_cache[key] = entry
+        if self.cache_path is not None:
+            with self._cache_lock, shelve.open(self.cache_path) as cache:
+                cache[key] = entry
+
+    @staticmethod
+    def _is_fresh(entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["fetched_at"] < entry.get("ttl", SCRAPE_CACHE_TTL)
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Builds the headers revalidating a stale cache entry instead of downloading the page again"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _prepare_request(self, params: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """
+        Validates the parameters and builds the Jina API URL and headers.
+
+        Raises:
+            ValueError: If required parameters are missing
+        """
+        self.logger.info("Scraping web content from: %s", params.get('url'))
 
         if not params.get("url"):
             raise ValueError("URL parameter is required")
 
+        headers = {
+            **self._base_headers,
+            'Accept': 'text/plain' if self._is_raw(params) else 'application/json'
+        }
+
+        return f"https://r.jina.ai/{params['url']}", headers
+
+    @functools.cached_property
+    def _base_headers(self) -> Dict[str, str]:
+        """
+        Headers shared by all Jina requests, built on first use.
+
+        Raises:
+            ValueError: If the Jina API key is not set
+        """
         jina_api_key = os.getenv("JINA_API_KEY")
         if not jina_api_key:
             raise ValueError("JINA_API_KEY environment variable is required")
 
-        headers = {
+        return {
             "Authorization": f"Bearer {jina_api_key}",
-            'Accept': 'application/json',
             "X-With-Links-Summary": "true"
         }
 
-        try:
-            response = requests.get(
-                f"https://r.jina.ai/{params['url']}",
-                headers=headers
-            )
-            response.raise_for_status()
 
-            result = response.json()
-            self.logger.info(f"Web scraping successful: {response.status_code}")
-            return {
-                "content": result.get("data")['content'],
-            }
-        except requests.RequestException as e:
-            self.logger.error(f"Error scraping web content: {e}")
-            return None
+class WebScrapeBatchTool(AgentTool):
+    """Tool for scraping several web pages at once using Jina API"""
+
+    name = "web_scrape_batch"
+    description = """
+    Scrapes several web pages at once using Jina API. Use it instead of web_scrape when 2 or more URLs are known.
+    Returns the content of each page, or null for pages that could not be scraped.
+    """
+    required_params = {
+        "urls": "List of URLs of the webpages to scrape"
+    }
+    optional_params = {
+        "raw": "Set to true to get the pages as plain text, without the JSON envelope (faster for large pages)"
+    }
+
+    def __init__(self, scrape_tool: Optional[WebScrapeTool] = None):
+        """
+        Initialize the tool
+
+        Args:
+            scrape_tool (WebScrapeTool, optional): Tool scraping the individual pages, pass the agent's
+                web_scrape tool to share its cache
+        """
+        super().__init__()
+        self.scrape_tool = scrape_tool or WebScrapeTool()
+
+    def execute(self, params: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Scrapes the web pages concurrently in worker threads.
+
+        Args:
+            params (dict): Dictionary containing:
+                - urls (List[str]): The webpage URLs to scrape
+                - raw (bool, optional): Whether to request the pages as plain text
+
+        Returns:
+            dict: Content of each page, in the order of the URLs
+
+        Raises:
+            ValueError: If required parameters are missing
+        """
+        page_params = self._page_params(params)
+        with ThreadPoolExecutor(max_workers=SCRAPE_BATCH_CONCURRENCY) as executor:
+            results = list(executor.map(self.scrape_tool.execute, page_params))
+        return self._format_results(page_params, results)
+
+    async def aexecute(self, params: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Scrapes the web pages concurrently on the shared HTTP clients, bounded by SCRAPE_BATCH_CONCURRENCY"""
+        page_params = self._page_params(params)
+        self.scrape_tool.http_session = self.http_session
+        self.scrape_tool.http2_client = self.http2_client
+        semaphore = asyncio.Semaphore(SCRAPE_BATCH_CONCURRENCY)
+
+        async def scrape(page: Dict[str, Any]) -> Union[Dict, None]:
+            async with semaphore:
+                return await self.scrape_tool.aexecute(page)
+
+        results = await asyncio.gather(*(scrape(page) for page in page_params))
+        return self._format_results(page_params, results)
+
+    def _page_params(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Validates the parameters and splits them into the parameters of the individual scrapes.
+
+        Raises:
+            ValueError: If required parameters are missing
+        """
+        urls = params.get("urls")
+        if not urls or not isinstance(urls, list):
+            raise ValueError("URLs parameter is required and must be a list")
+
+        self.logger.info("Scraping %s web pages", len(urls))
+        return [{"url": url, "raw": params.get("raw", False)} for url in dict.fromkeys(urls)]
+
+    @staticmethod
+    def _format_results(page_params: List[Dict[str, Any]],
+                        results: List[Union[Dict, None]]) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            "pages": [
+                {"url": page["url"], "content": result["content"] if result else None}
+                for page, result in zip(page_params, results)
+            ]
+        }
 
 
 class FinalAnswerTool(AgentTool):
@@ -189,17 +602,23 @@ class FinalAnswerTool(AgentTool):
         "task_description": "The original task description"
     }
 
-    def __init__(self, llm_service):
+    def __init__(self, llm_service, on_token: Optional[Callable[[str], None]] = None):
         """
         Initialize the tool with LLM service
 
         Args:
             llm_service: Service for LLM interactions
+            on_token (callable, optional): Called with each piece of the answer as it is streamed
         """
         super().__init__()
         self.llm_service = llm_service
+        self.on_token = on_token
 
     def execute(self, params: Dict[str, Any]) -> Union[str, None]:
+        """Prepares the final answer outside of an event loop, see aexecute"""
+        return asyncio.run(self.aexecute(params))
+
+    async def aexecute(self, params: Dict[str, Any]) -> Union[str, None]:
         """
         Prepares the final answer using the key findings and an LLM.
         
@@ -222,27 +641,46 @@ class FinalAnswerTool(AgentTool):
             raise ValueError("Task description parameter is required")
 
         # Prepare the prompt for the LLM
-        prompt = f"""
+        def build_messages(key_findings: str) -> List[Dict[str, Any]]:
+            prompt = f"""
         Task Description: {params["task_description"]}
 
         Key Findings:
-        {json.dumps(params["key_findings"], indent=2)}
+        {key_findings}
 
         Based on the task description and the key findings provided, generate a final answer.
         The answer should directly address the task description and incorporate relevant key findings.
 
         Final Answer:
         """
+            return [{"role": "system", "content": prompt}]
+
+        # Key findings are the only unbounded part of the prompt
+        key_findings = orjson.dumps(params["key_findings"], option=orjson.OPT_INDENT_2).decode()
+        messages = build_messages(key_findings)
+        truncated_findings = truncate_to_budget(messages, key_findings)
+        if truncated_findings is not key_findings:
+            messages = build_messages(truncated_findings)
 
-        # Call the LLM service to generate the final answer
+        # Stream the final answer, so that it can be shown while it is generated
         try:
-            response = self.llm_service.completion(
-                messages=[{"role": "system", "content": prompt}],
-                max_tokens=500
+            stream = await self.llm_service.completion(
+                messages=messages,
+                stream=True,
+                max_tokens=FINAL_ANSWER_MAX_TOKENS
             )
-            final_answer = response.choices[0].message.content.strip()
+            parts = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    parts.append(token)
+                    if self.on_token is not None:
+                        self.on_token(token)
+            final_answer = "".join(parts).strip()
         except Exception as e:
-            self.logger.error(f"Error generating final answer with LLM: {e}")
+            self.logger.error("Error generating final answer with LLM: %s", e)
             return None
 
         self.logger.info("Final answer prepared successfully using LLM")
@@ -1,49 +1,77 @@
+import asyncio
 import logging
+from typing import Any, List
 
 from dotenv import load_dotenv
 
-from agent import Agent
-from agent_tools import FinalAnswerTool, MakeApiCallTool, WebScrapeTool
+from agent import Agent, create_http2_client, create_http_session
+from agent_tools import FinalAnswerTool, MakeApiCallTool, WebScrapeBatchTool, WebScrapeTool
+from semantic_cache import SemanticLLMCache
 
 load_dotenv()
 
+
+async def process_tasks(llm_service, tasks: List[str]) -> List[Any]:
+    """
+    Runs the tasks concurrently, each with its own agent. The tools, caches and HTTP
+    connection pools are created once and shared by all the agents, except for the final
+    answer tool. A single task's answer is streamed to stdout, concurrent answers would interleave.
+    """
+    # Create available tools
+    api_tool = MakeApiCallTool()
+    web_scrape_tool = WebScrapeTool(cache_path=".scrape_cache")
+    web_scrape_batch_tool = WebScrapeBatchTool(scrape_tool=web_scrape_tool)
+    on_token = (lambda token: print(token, end="", flush=True)) if len(tasks) == 1 else None
+    semantic_cache = SemanticLLMCache(llm_service, path='.agent_semantic_cache.db')
+
+    async with create_http_session() as http_session, create_http2_client() as http2_client:
+        # Create agents
+        agents = [
+            Agent(
+                [
+                    api_tool, web_scrape_tool, web_scrape_batch_tool,
+                    FinalAnswerTool(llm_service=llm_service, on_token=on_token)
+                ],
+                llm_service,
+                cache_path='.agent_cache',
+                semantic_cache=semantic_cache,
+                http_session=http_session,
+                http2_client=http2_client
+            )
+            for _ in tasks
+        ]
+        results = await asyncio.gather(*(agent.run(task) for agent, task in zip(agents, tasks)))
+
+    for agent in agents:
+        print(f"LLM usage: {agent.get_usage_stats()}")
+    return results
+
+
 # Example usage
 if __name__ == "__main__":
-    import asyncio
     from services import OpenAiService
 
-    async def main():
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-
-        llm_service = OpenAiService()
-        
-        # Create available tools
-        api_tool = MakeApiCallTool()
-        web_scrape_tool = WebScrapeTool()
-        final_answer_tool = FinalAnswerTool(llm_service=llm_service)
-
-        # Create agent
-        agent = Agent([api_tool, web_scrape_tool, final_answer_tool], llm_service)
-
-        # Example task
-        task = """Fetch the questions data from the [[AG3NTS_HQ_URL]]/data/[[AG3NTS_API_KEY]]/softo.json using the API key. 
-        Then answer the questions in the data with the content available on under this url https://softo.ag3nts.org. 
-        If you cannot find the answer in the content, try to find it on relevant subpages.
-        
-        The expected output is a JSON object with the following structure:
-        {
-            "questionID like 01": "concise and specific answer to the first question",
-            ...
-            "questionID like n": "concise and specific answer to the n-th question"
-        }
-        """
-
-        result = await agent.run(task)
-        if result:
-            print(result)
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
 
-    asyncio.run(main())
+    # Example task
+    task = """Fetch the questions data from the [[AG3NTS_HQ_URL]]/data/[[AG3NTS_API_KEY]]/softo.json using the API key. 
+    Then answer the questions in the data with the content available on under this url https://softo.ag3nts.org. 
+    If you cannot find the answer in the content, try to find it on relevant subpages.
+    
+    The expected output is a JSON object with the following structure:
+    {
+        "questionID like 01": "concise and specific answer to the first question",
+        ...
+        "questionID like n": "concise and specific answer to the n-th question"
+    }
+    """
+
+    tasks = [task]
+    for result in asyncio.run(process_tasks(OpenAiService(), tasks)):
+        # A single task's final answer was already streamed, only the findings of an unfinished one are printed
+        if result and not (len(tasks) == 1 and isinstance(result, str)):
+            print(result)
@@ -0,0 +1,71 @@
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticLLMCache:
+    """
+    Cache of LLM responses looked up by embedding similarity instead of exact prompt match.
+    Entries are grouped into namespaces and persisted in a SQLite database.
+    """
+
+    def __init__(self, llm_service, path: str = ':memory:', threshold: float = 0.92):
+        """
+        Initialize the cache
+
+        Args:
+            llm_service: OpenAiService instance used to embed the lookup keys
+            path (str): Path of the SQLite database persisting the cache
+            threshold (float): Minimal cosine similarity for a cache hit
+        """
+        self.llm_service = llm_service
+        self.threshold = threshold
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (namespace TEXT, embedding BLOB, response TEXT)"
+        )
+        # Per namespace matrix of normalized embeddings and the matching responses
+        self._index: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embeds the lookup key and normalizes it, so that a dot product is the cosine similarity"""
+        embedding = np.asarray(await self.llm_service.embedding(text), dtype=np.float32)
+        return embedding / np.linalg.norm(embedding)
+
+    def search(self, namespace: str, embedding: np.ndarray, threshold: Optional[float] = None) -> Optional[str]:
+        """Returns the response of the most similar entry, if it is above the threshold"""
+        embeddings, responses = self._load(namespace)
+        if not responses:
+            return None
+
+        similarities = embeddings @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < (self.threshold if threshold is None else threshold):
+            return None
+        return responses[best]
+
+    def add(self, namespace: str, embedding: np.ndarray, response: str) -> None:
+        """Stores the response under the given embedding"""
+        embeddings, responses = self._load(namespace)
+        embeddings = np.vstack([embeddings, embedding]) if responses else embedding[np.newaxis, :]
+        self._index[namespace] = (embeddings, responses + [response])
+
+        self._db.execute(
+            "INSERT INTO responses (namespace, embedding, response) VALUES (?, ?, ?)",
+            (namespace, embedding.astype(np.float32).tobytes(), response)
+        )
+        self._db.commit()
+
+    def _load(self, namespace: str) -> Tuple[np.ndarray, List[str]]:
+        """Loads the namespace entries from the database on first use"""
+        if namespace not in self._index:
+            rows = self._db.execute(
+                "SELECT embedding, response FROM responses WHERE namespace = ?", (namespace,)
+            ).fetchall()
+            embeddings = [np.frombuffer(embedding, dtype=np.float32) for embedding, _ in rows]
+            self._index[namespace] = (
+                np.vstack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32),
+                [response for _, response in rows]
+            )
+        return self._index[namespace]
@@ -0,0 +1,63 @@
+from typing import Dict, List, Any
+
+from services import TOKENS_PER_MINUTE, count_message_tokens, get_encoding
+
+DEFAULT_MODEL = 'gpt-4o'
+
+# Context window sizes of the models used by the agent
+MODEL_CONTEXT_TOKENS = {
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+}
+# Tokens kept free in the context window for the response
+RESPONSE_RESERVE_TOKENS = 1024
+
+
+def prompt_budget(model: str = DEFAULT_MODEL) -> int:
+    """
+    Returns the maximum number of prompt tokens for the model, capped by the tokens
+    a single request may spend per minute when the LLM service is rate limited
+    """
+    context_tokens = MODEL_CONTEXT_TOKENS.get(model, MODEL_CONTEXT_TOKENS[DEFAULT_MODEL])
+    if TOKENS_PER_MINUTE:
+        context_tokens = min(context_tokens, TOKENS_PER_MINUTE)
+    return context_tokens - RESPONSE_RESERVE_TOKENS
+
+
+def count_text_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Counts the tokens of the text"""
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens(messages: List[Dict[str, Any]], model: str = DEFAULT_MODEL) -> int:
+    """Counts the tokens of the chat messages the same way as the rate limiter of the LLM service"""
+    return count_message_tokens(messages, model)
+
+
+def truncate_middle(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Keeps the beginning and the end of the text within max_tokens, dropping the middle"""
+    encoding = get_encoding(model)
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+
+    keep = max(max_tokens, 0) // 2
+    truncated = len(tokens) - 2 * keep
+    return (
+        f"{encoding.decode(tokens[:keep])}"
+        f"\n...[truncated {truncated} tokens]...\n"
+        f"{encoding.decode(tokens[len(tokens) - keep:])}"
+    )
+
+
+def truncate_to_budget(messages: List[Dict[str, Any]], text: str, model: str = DEFAULT_MODEL) -> str:
+    """
+    Truncates the middle of text, which is part of the messages, by the number of tokens
+    the messages exceed the model's prompt budget. Returns text unchanged when they fit.
+    """
+    overflow = count_tokens(messages, model) - prompt_budget(model)
+    if overflow <= 0:
+        return text
+
+    print(f"Prompt exceeds the token budget by {overflow} tokens, truncating")
+    return truncate_middle(text, count_text_tokens(text, model) - overflow, model)
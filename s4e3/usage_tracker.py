@@ -0,0 +1,58 @@
+from typing import Any, Dict
+
+# Number of recorded calls after which a low prompt cache hit rate is reported
+CACHE_HIT_RATE_MIN_CALLS = 5
+# Prompt cache hit rate below which the prompt structure likely defeats prefix caching
+CACHE_HIT_RATE_WARNING = 0.3
+
+
+class UsageTracker:
+    """Accumulates token usage of LLM responses, including tokens served from the provider's prompt cache"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_creation_tokens = 0
+        self._warned = False
+
+    def add(self, usage: Any) -> None:
+        """Records the usage of a single LLM response"""
+        if usage is None:
+            return
+
+        self.calls += 1
+        self.prompt_tokens += getattr(usage, 'prompt_tokens', None) or getattr(usage, 'input_tokens', 0) or 0
+        self.completion_tokens += (
+            getattr(usage, 'completion_tokens', None) or getattr(usage, 'output_tokens', 0) or 0
+        )
+
+        # OpenAI reports cached tokens in the prompt details, Anthropic on the usage itself
+        details = getattr(usage, 'prompt_tokens_details', None)
+        self.cached_tokens += (
+            getattr(details, 'cached_tokens', None) or getattr(usage, 'cache_read_input_tokens', 0) or 0
+        )
+        self.cache_creation_tokens += getattr(usage, 'cache_creation_input_tokens', 0) or 0
+
+        if (not self._warned and self.calls >= CACHE_HIT_RATE_MIN_CALLS
+                and self.cache_hit_rate < CACHE_HIT_RATE_WARNING):
+            self._warned = True
+            print(f"WARNING: prompt cache hit rate is {self.cache_hit_rate:.0%} after {self.calls} calls, "
+                  f"the prompt structure may be defeating provider prefix caching")
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of prompt tokens served from the provider's prompt cache"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the accumulated usage statistics"""
+        return {
+            'calls': self.calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
+            'cache_creation_tokens': self.cache_creation_tokens,
+            'cache_hit_rate': self.cache_hit_rate,
+        }
@@ -1,16 +1,32 @@
-import asyncio
-import json
+import re
+import shelve
 
-from flask import Flask, request, jsonify
+import orjson
+from quart import Quart, request, jsonify
 
 from services import OpenAiService
+from vector_store import aindex_chunk, asearch_with_score, awarmup
 
-app = Flask(__name__)
+# Quart serves the async route on a single event loop shared by all requests,
+# so the OpenAI client's connection pool is reused between them
+app = Quart(__name__)
 
 # Initialize OpenAI service
 ai_service = OpenAiService()
 
-# This will be our map description prompt - we'll fill it later
+# File persisting descriptions of processed instructions between restarts
+DESCRIPTION_CACHE_FILE = '.description_cache'
+
+# Descriptions keyed by normalized instruction
+_description_cache: dict[str, dict] = {}
+
+# Minimal similarity of a previously seen instruction whose description is reused
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# Kind of the vector store documents holding described instructions
+DESCRIPTION_DOCUMENT_KIND = 'location_description'
+
+# Static system prompt, kept byte-identical between requests so the provider serves it from its prompt cache.
+# Never interpolate request data into it, that belongs in the later user message
 MAP_DESCRIPTION = """
 # Polish Language 4x4 Map Navigation System
 
@@ -50,14 +66,9 @@ Process Polish language movement instructions on a 4x4 map, tracking position ch
    - "do końca w lewo" (all the way left)
    - "do końca w prawo" (all the way right)
 4. Grid boundaries are 4x4 (coordinates 1-4)
-5. When encountering invalid movement (outside grid):
-   - STOP at the last valid position
-   - Include reasoning about why movement stopped
-6. For compound movements:
-   - Process each movement separately
-   - Include each step in the output
-7. ALL thinking and reasoning MUST be in English
-8. Terrain types are fixed as shown in the map layout
+5. When encountering invalid movement (outside grid), STOP at the last valid position
+6. For compound movements, process each movement separately in order
+7. Terrain types are fixed as shown in the map layout
 </prompt_rules>
 
 <directions_rules>
@@ -68,124 +79,223 @@ RIGHT - "w prawo" - Move right one field - from (x,y) to (x+1,y)
 </directions_rules>
 
 <output_format>
-Response MUST be valid JSON with the following structure:
-{
-    "_thinking": "String explaining step-by-step reasoning in English",
-    "steps": {
-        "1": "Description of first movement with coordinates",
-        "2": "Description of second movement with coordinates",
-        ...
-    },
-    "reasoning": "String explaining final position analysis in English",
-    "description": "String containing terrain type in Polish from the map"
-}
+Response MUST be valid JSON with a single field and nothing else:
+{"description": "String containing terrain type in Polish from the map"}
 </output_format>
 
 <prompt_examples>
 1. Simple Movement:
 Input: {"instruction": "w prawo"}
-Output: {
-    "_thinking": "Moving one step right from starting position (1,1)",
-    "steps": {
-        "1": "Move right (x+1,y) from (1,1) to (2,1)"
-    },
-    "reasoning": "Reached field (2,1)",
-    "description": "trawa"
-}
+Output: {"description": "trawa"}
 
 2. Complex Movement:
 Input: {"instruction": "w prawo, na sam dół"}
-Output: {
-    "_thinking": "First moving right, then all the way down",
-    "steps": {
-        "1": "Move right (x+1,y) from (1,1) to (2,1)",
-        "2": "Move down (x,y+1) from (2,1) to (2,2)",
-        "3": "Move down (x,y+1) from (2,2) to (2,3)",
-        "4": "Move down (x,y+1) from (2,3) to (2,4)"
-    },
-    "reasoning": "Reached bottom row at position (2,4)",
-    "description": "skały"
-}
+Output: {"description": "skały"}
 
 3. Invalid Movement:
 Input: {"instruction": "w lewo"}
-Output: {
-    "_thinking": "Cannot move left from starting position (1,1) as it would be outside the grid",
-    "steps": {},
-    "reasoning": "Staying at starting position as movement is invalid: (x-1,y) would result in (0,1), which is out of bounds",
-    "description": "starting point"
-}
+Output: {"description": "starting point"}
 
 4. Full Traversal:
 Input: {"instruction": "na sam dół, do końca w prawo"}
-Output: {
-    "_thinking": "Moving all the way down first, then all the way right",
-    "steps": {
-        "1": "Move down (x,y+1) from (1,1) to (1,2)",
-        "2": "Move down (x,y+1) from (1,2) to (1,3)",
-        "3": "Move down (x,y+1) from (1,3) to (1,4)",
-        "4": "Move right (x+1,y) from (1,4) to (2,4)",
-        "5": "Move right (x+1,y) from (2,4) to (3,4)",
-        "6": "Move right (x+1,y) from (3,4) to (4,4)"
-    },
-    "reasoning": "Reached bottom-right corner at position (4,4)",
-    "description": "jaskinia"
-}
+Output: {"description": "jaskinia"}
 </prompt_examples>
 
 <error_handling>
-1. For invalid movements:
-   - Return current position's description
-   - Explain why movement cannot continue
-   - Include any valid steps that were completed before the invalid movement
-2. For unrecognized commands:
-   - Stay at current position
-   - Explain that command is not recognized
-3. For empty or invalid input:
-   - Return starting position description
-   - Include explanation of the error
+1. For invalid movements, return the description of the last valid position
+2. For unrecognized commands, stay at the current position
+3. For empty or invalid input, return the starting position description
 </error_handling>
 """
 
+# Leading message shared by every request, the cached prompt prefix
+SYSTEM_MESSAGE = {"role": "system", "content": MAP_DESCRIPTION}
+
+
+# Terrain of the map fields keyed by (x, y), as in MAP_DESCRIPTION
+GRID = {
+    (1, 1): "starting point", (1, 2): "trawa", (1, 3): "trawa", (1, 4): "skały",
+    (2, 1): "trawa", (2, 2): "wiatrak", (2, 3): "trawa", (2, 4): "skały",
+    (3, 1): "drzewo", (3, 2): "trawa", (3, 3): "skały", (3, 4): "samochód",
+    (4, 1): "dom", (4, 2): "trawa", (4, 3): "dwa drzewa", (4, 4): "jaskinia",
+}
+MAP_SIZE = 4
+
+# Position change of each movement command, moves beyond the map edge stop at it
+MOVES = {
+    "w prawo": (1, 0),
+    "w lewo": (-1, 0),
+    "w dół": (0, 1),
+    "w górę": (0, -1),
+    "na sam dół": (0, MAP_SIZE - 1),
+    "na samą górę": (0, 1 - MAP_SIZE),
+    "do końca w lewo": (1 - MAP_SIZE, 0),
+    "do końca w prawo": (MAP_SIZE - 1, 0),
+}
+
+# Single scan tokenizer of instructions: movement commands with any whitespace between their words
+# (longest first, so "do końca w prawo" wins over "w prawo"), separators of compound instructions,
+# and any other word, which makes the instruction unrecognized
+MOVE_PATTERN = '|'.join(r'\s+'.join(map(re.escape, move.split())) for move in sorted(MOVES, key=len, reverse=True))
+INSTRUCTION_TOKEN_PATTERN = re.compile(
+    rf'(?P<move>{MOVE_PATTERN})|(?P<separator>,|\b(?:i|a|potem|następnie)\b)|(?P<other>\S)'
+)
+
+# Stems of the direction words, also in free-form phrasings like "na prawo" or "idziemy na dół".
+# Instructions without any of them are answered with the starting point
+DIRECTION_PATTERN = re.compile(r'praw|lew|d[oó][lł]|g[oó]r')
+
+# Words deciding where an instruction leads: whole movement commands, direction stems and distances.
+# Similar instructions are only treated as the same when these match in order
+ROUTE_TOKEN_PATTERN = re.compile(
+    rf'{MOVE_PATTERN}|{DIRECTION_PATTERN.pattern}|\d+|jed[ne]|dw[aie]|trz|czter|sam|końc|maks'
+)
+
+# Output token budget of the description, enough for the single field JSON object
+DESCRIPTION_MAX_TOKENS = 16
+
+# Completed "description" field of a partially streamed JSON response
+DESCRIPTION_FIELD_PATTERN = re.compile(r'"description"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def normalize_instruction(instruction: str) -> str:
+    return ' '.join(instruction.lower().split())
+
+
+def route_tokens(instruction: str) -> list[str]:
+    return [' '.join(token.split()) for token in ROUTE_TOKEN_PATTERN.findall(normalize_instruction(instruction))]
+
+
+def navigate(instruction: str):
+    """
+    Get the terrain at the end of an instruction built only from the known movement commands,
+    or None when any part of it is not recognized
+    """
+    x, y = 1, 1
+    for token in INSTRUCTION_TOKEN_PATTERN.finditer(instruction):
+        if token.lastgroup == 'other':
+            return None
+        if token.lastgroup == 'separator':
+            continue
+        dx, dy = MOVES[' '.join(token.group().split())]
+        x = min(max(x + dx, 1), MAP_SIZE)
+        y = min(max(y + dy, 1), MAP_SIZE)
+    return GRID[(x, y)]
+
 
 async def get_location_description(instruction):
+    """
+    Get location description based on flight instruction, reusing the answers to instructions seen before
+    """
+    key = normalize_instruction(instruction)
+    terrain = navigate(key)
+    if terrain is not None:
+        return {"description": terrain}
+
+    if key not in _description_cache:
+        with shelve.open(DESCRIPTION_CACHE_FILE) as cache:
+            if key in cache:
+                _description_cache[key] = cache[key]
+
+    if key not in _description_cache:
+        description = await find_similar_description(key)
+        if description is None:
+            description = await describe_location(instruction)
+            if not isinstance(description, dict):
+                return description
+            await aindex_chunk(key, {"kind": DESCRIPTION_DOCUMENT_KIND, "response": description})
+        _description_cache[key] = description
+        with shelve.open(DESCRIPTION_CACHE_FILE) as cache:
+            cache[key] = description
+
+    return _description_cache[key]
+
+
+async def find_similar_description(instruction: str):
+    """
+    Get the description of the most similar previously described instruction, if it is similar enough
+    and describes the same route. Instructions differing only in a direction word embed almost identically
+    """
+    results = await asearch_with_score(
+        instruction, limit=1, filter_func=lambda doc: doc.metadata.get("kind") == DESCRIPTION_DOCUMENT_KIND
+    )
+    if (results and results[0][1] >= SEMANTIC_CACHE_THRESHOLD
+            and route_tokens(results[0][0].page_content) == route_tokens(instruction)):
+        print(f"Reusing description of similar instruction: {results[0][0].page_content}")
+        return results[0][0].metadata["response"]
+    return None
+
+
+async def describe_location(instruction):
     """
     Get location description based on flight instruction using OpenAI API
     """
     messages = [
-        {"role": "system", "content": MAP_DESCRIPTION},
+        SYSTEM_MESSAGE,
         {"role": "user",
          "content": f"Based on the flight instruction: '{instruction}', what is at the final location? Respond with maximum two words."}
     ]
 
     try:
-        response = await ai_service.completion(
+        stream = await ai_service.completion(
             messages=messages,
-            response_format={"type": "json_object"}
+            stream=True,
+            response_format={"type": "json_object"},
+            max_tokens=DESCRIPTION_MAX_TOKENS,
+            temperature=0
         )
-        print(response.choices[0].message.content)
+        # The description is returned as soon as its field is complete, without waiting for the rest
+        content = ""
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                content += chunk.choices[0].delta.content
+                match = DESCRIPTION_FIELD_PATTERN.search(content)
+                if match:
+                    await stream.close()
+                    print(content)
+                    return {"description": orjson.loads(match.group(1))}
+        print(content)
 
-        return json.loads(response.choices[0].message.content)
+        return orjson.loads(content)
     except Exception as e:
         print(f"Error calling OpenAI API: {e}")
         return "error occurred"
 
 
+@app.before_serving
+async def warmup_connections():
+    """
+    Open the embeddings connection used by the semantic cache before the first request arrives
+    """
+    try:
+        await awarmup()
+    except Exception as e:
+        print(f"Warming up the embeddings connection failed: {e}")
+
+
 @app.route('/', methods=['POST'])
-def process_instruction():
+async def process_instruction():
     """
     Process incoming drone flight instructions
     """
     try:
-        data = request.get_json()
+        data = await request.get_json()
 
         if not data or 'instruction' not in data:
             return jsonify({"error": "Missing instruction in request"}), 400
 
         instruction = data['instruction']
         print(f"Received instruction: {instruction}")
-        # Run the async function in the synchronous Flask route
-        location_description = asyncio.run(get_location_description(instruction))
+        if not DIRECTION_PATTERN.search(instruction.lower()):
+            return jsonify({
+                "description": GRID[(1, 1)],
+                "debug": {
+                    "received_instruction": instruction,
+                    "reason": "no_valid_moves"
+                }
+            })
+
+        location_description = await get_location_description(instruction)
 
         return jsonify({
             "description": location_description['description'],
@@ -1,11 +1,20 @@
+import asyncio
 import base64
+import contextlib
+import functools
+import hashlib
+import mmap
+import os
+import re
+import time
 from collections.abc import AsyncIterable
 from pathlib import Path
 
+import httpx
 import tiktoken
 from PIL import Image
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
 from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessageParam
 
 load_dotenv()
@@ -13,7 +22,11 @@ load_dotenv()
 
 def encode_image(image_path: str) -> str:
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+        if os.fstat(image_file.fileno()).st_size == 0:
+            return ""
+        # Encodes straight from the page cache instead of reading a copy of the image first
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as image_data:
+            return base64.b64encode(image_data).decode("ascii")
 
 
 def list_files(directory: str):
@@ -21,42 +34,168 @@ def list_files(directory: str):
 
 
 def resize_image(image_path: str, size) -> str:
+    # The resized file is named after the source's modification time and size, so unchanged images are reused
+    stat = os.stat(image_path)
+    key = hashlib.blake2b(f"{stat.st_mtime_ns}:{stat.st_size}:{tuple(size)}".encode(), digest_size=8).hexdigest()
+    path = Path(image_path)
+    resized_path = f"resized_{path.stem}_{key}{path.suffix}"
+    if os.path.exists(resized_path):
+        return resized_path
+
     with Image.open(image_path) as img:
+        # Lets JPEG images be decoded directly at a reduced scale
+        img.draft(img.mode, tuple(size))
         img.thumbnail(size)
-        resized_path = f"resized_{Path(image_path).name}"
         img.save(resized_path)
         return resized_path
 
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model(model)
+
+
+def count_message_tokens(messages: [ChatCompletionMessageParam], model: str = 'gpt-4o') -> int:
+    encoding = get_encoding(model)
+    # Every message is wrapped in 3 formatting tokens and the reply is primed with 3 more
+    num_tokens = 3
+    for message in messages:
+        num_tokens += 3
+        content = message.get('content')
+        if isinstance(content, list):
+            content = "".join(part.get('text', '') for part in content if isinstance(part, dict))
+        # Special tokens in the messages are counted as plain text
+        if content:
+            num_tokens += len(encoding.encode_ordinary(content))
+        if 'name' in message:
+            num_tokens += 1 + len(encoding.encode_ordinary(message['name']))
+    return num_tokens
+
+
+# Account limits of the completions API, set in the environment to match the usage tier.
+# Requests are rate limited only when both per minute limits are set
+REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 0)) or None
+TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 0)) or None
+MAX_CONCURRENT_REQUESTS = int(os.getenv('OPENAI_MAX_CONCURRENT_REQUESTS', 50))
+
+# Matches the parts of durations like "6m0s" or "20ms" in rate limit reset headers
+_DURATION_PART_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(duration: str) -> float:
+    return sum(float(value) * _DURATION_UNITS[unit] for value, unit in _DURATION_PART_RE.findall(duration))
+
+
+class RateLimiter:
+    """
+    Token buckets budgeting requests and tokens per minute, plus a cap on concurrent requests,
+    so that calls wait for capacity instead of failing with 429 responses.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_concurrent: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        # Time the buckets were last refilled, set into the future to pause after a 429 response
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        if tokens > self.tokens_per_minute:
+            raise ValueError(f"Request of {tokens} tokens exceeds the limit of {self.tokens_per_minute} tokens per minute")
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep(max(
+                    self._updated - time.monotonic(),
+                    (1 - self._requests) * 60 / self.requests_per_minute,
+                    (tokens - self._tokens) * 60 / self.tokens_per_minute
+                ))
+
+    @contextlib.asynccontextmanager
+    async def limit(self, tokens: int):
+        """Waits for the capacity of a request and holds one of the concurrent request slots while it runs"""
+        await self.acquire(tokens)
+        async with self.semaphore:
+            yield
+
+    def pause(self, seconds: float):
+        """Empties the buckets and stops refilling them for the given time"""
+        self._requests = self._tokens = 0
+        self._updated = max(self._updated, time.monotonic() + seconds)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = max(now - self._updated, 0)
+        if elapsed:
+            self._updated = now
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+
+# HTTP/2 multiplexes concurrent requests to the API over a few pooled connections.
+# The timeouts match the SDK defaults, as transcriptions and long completions take minutes
+_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    timeout=httpx.Timeout(600.0, connect=5.0)
+)
+
+
 class OpenAiService:
-    _client = AsyncOpenAI()
-    _encoding = tiktoken.model.encoding_for_model("gpt-4o")
+    _client = AsyncOpenAI(http_client=_http_client)
+    _rate_limiter = (
+        RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, MAX_CONCURRENT_REQUESTS)
+        if REQUESTS_PER_MINUTE and TOKENS_PER_MINUTE else None
+    )
 
     async def completion(
         self, 
         messages: [ChatCompletionMessageParam], 
         model: str = 'gpt-4o',
             stream: bool = False,
-            response_format: dict | None = None
+            response_format: dict | None = None,
+            **kwargs
     ) -> ChatCompletion | AsyncIterable[ChatCompletionChunk]:
+        limit = contextlib.nullcontext()
+        if self._rate_limiter is not None:
+            limit = self._rate_limiter.limit(count_message_tokens(messages, model))
         try:
-            return await self._client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=stream,
-                response_format=response_format
+            async with limit:
+                return await self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=stream,
+                    response_format=response_format,
+                    **kwargs
+                )
+
+        except RateLimitError as e:
+            if self._rate_limiter is None:
+                print(f"Error: {e}")
+                raise e
+            reset = max(
+                parse_duration(e.response.headers.get('x-ratelimit-reset-requests', '')),
+                parse_duration(e.response.headers.get('x-ratelimit-reset-tokens', ''))
             )
+            print(f"Rate limited, pausing requests for {reset}s")
+            self._rate_limiter.pause(reset)
+            raise e
 
         except Exception as e:
             print(f"Error: {e}")
             raise e
 
-    async def count_tokens(self, messages: [ChatCompletionMessageParam]) -> int:
-        tokens = []
-        for message in messages:
-            print(message.__str__())
-            tokens += self._encoding.encode(message.__str__())
-        return len(tokens)
+    async def count_tokens(self, messages: [ChatCompletionMessageParam], model: str = 'gpt-4o') -> int:
+        return count_message_tokens(messages, model)
 
     async def transcribe(
         self, 
@@ -93,8 +232,16 @@ class OpenAiService:
 
     async def extract_text_from_image(
         self, 
-        base64_image: str
+        image: str | bytes
     ):
+        # URLs of reachable images are passed through, only raw or base64 image data is sent inline
+        if isinstance(image, bytes):
+            image_url = f"data:image/jpeg;base64,{base64.b64encode(image).decode('ascii')}"
+        elif image.startswith(('http://', 'https://', 'data:')):
+            image_url = image
+        else:
+            image_url = f"data:image/jpeg;base64,{image}"
+
         try:
             response = await self.completion(
                 messages=[
@@ -104,7 +251,7 @@ class OpenAiService:
                             {
                                 'type': 'image_url',
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
+                                    "url": image_url,
                                     'detail': 'high'
                                 }
                             },
@@ -1,22 +1,83 @@
+import faiss
+import httpx
 from langchain.schema import Document
-from langchain_community.vectorstores import InMemoryVectorStore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_openai import OpenAIEmbeddings
 
-vector_store = InMemoryVectorStore(OpenAIEmbeddings())
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIMENSIONS = 1536
+
+# Most texts the embeddings API accepts in a single request
+EMBEDDING_BATCH_SIZE = 2048
+
+# Connection pools shared by all the embeddings requests, so keepalive HTTP/2 connections are reused
+_http_limits = httpx.Limits(max_keepalive_connections=32)
+_http_client = httpx.Client(http2=True, limits=_http_limits)
+_http_async_client = httpx.AsyncClient(http2=True, limits=_http_limits)
+
+embeddings = OpenAIEmbeddings(
+    model=EMBEDDING_MODEL,
+    chunk_size=EMBEDDING_BATCH_SIZE,
+    show_progress_bar=False,
+    http_client=_http_client,
+    http_async_client=_http_async_client
+)
+
+# Normalized vectors in a flat inner product index, so that search scores are cosine similarities
+# computed by a vectorized scan
+vector_store = FAISS(
+    embedding_function=embeddings,
+    index=faiss.IndexFlatIP(EMBEDDING_DIMENSIONS),
+    docstore=InMemoryDocstore(),
+    index_to_docstore_id={},
+    normalize_L2=True,
+    distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+)
+
+
+def warmup():
+    """Opens the embeddings connection ahead of the first query, so it doesn't pay for the TLS handshake"""
+    embeddings.embed_query("warmup")
+
+
+async def awarmup():
+    await embeddings.aembed_query("warmup")
+
+
+def _image_documents(image_data) -> list[Document]:
+    # A single document embedding both the description and the context halves the embedding cost
+    return [Document(
+        page_content=f"{image_data['desc']}\n{image_data['context']}",
+        metadata={"data": f"{image_data['desc']} - {image_data['name']} - {image_data['url']} - {image_data['context']}"}
+    )]
+
+
+def _audio_documents(audio_data) -> list[Document]:
+    return [Document(page_content=f"{audio_data['transcript']}\n{audio_data['context']}", metadata={"data": audio_data})]
 
 
 def index_image(image_data):
-    document1 = Document(page_content=image_data["desc"], metadata={
-        "data": f"{image_data['desc']} - {image_data['name']} - {image_data['url']} - {image_data['context']}"})
-    document2 = Document(page_content=image_data["context"], metadata={
-        "data": f"{image_data['desc']} - {image_data['name']} - {image_data['url']} - {image_data['context']}"})
-    vector_store.add_documents([document1, document2])
+    vector_store.add_documents(_image_documents(image_data))
+
+
+def index_images_batch(image_datas: list):
+    """Indexes all the images with a single embeddings request per 2048 images"""
+    documents = [document for image_data in image_datas for document in _image_documents(image_data)]
+    if documents:
+        vector_store.add_documents(documents)
 
 
 def index_audio(audio_data):
-    document1 = Document(page_content=audio_data["transcript"], metadata={"data": audio_data})
-    document2 = Document(page_content=audio_data["context"], metadata={"data": audio_data})
-    vector_store.add_documents([document1, document2])
+    vector_store.add_documents(_audio_documents(audio_data))
+
+
+def index_audios_batch(audio_datas: list):
+    """Indexes all the audios with a single embeddings request per 2048 audios"""
+    documents = [document for audio_data in audio_datas for document in _audio_documents(audio_data)]
+    if documents:
+        vector_store.add_documents(documents)
 
 
 def index_chunk(chunk_text, metadata={}):
@@ -24,5 +85,28 @@ def index_chunk(chunk_text, metadata={}):
     vector_store.add_documents([document])
 
 
+def index_chunks_batch(chunk_texts: list, metadata={}):
+    documents = [Document(page_content=chunk_text, metadata=metadata) for chunk_text in chunk_texts]
+    if documents:
+        vector_store.add_documents(documents)
+
+
+async def aindex_chunk(chunk_text, metadata={}):
+    document = Document(page_content=chunk_text, metadata=metadata)
+    await vector_store.aadd_documents([document])
+
+
+# Candidates fetched per requested result before filtering, so that filtered searches still return up to limit results
+FILTER_FETCH_FACTOR = 4
+
+
 def search(query, limit=10, filter_func=None) -> list[Document]:
-    return vector_store.similarity_search(query=query, filter=filter_func, k=limit)
+    return vector_store.similarity_search(
+        query=query, filter=filter_func, k=limit, fetch_k=max(limit * FILTER_FETCH_FACTOR, 20)
+    )
+
+
+async def asearch_with_score(query, limit=10, filter_func=None) -> list[tuple[Document, float]]:
+    return await vector_store.asimilarity_search_with_score(
+        query=query, filter=filter_func, k=limit, fetch_k=max(limit * FILTER_FETCH_FACTOR, 20)
+    )